@@ -31,6 +31,9 @@ except Exception as e:
 finally:
     os.chdir(original_cwd)
 
+# Response types passed back as plain text; everything else is base64-encoded
+TEXT_CONTENT_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
 def handler(request):
     """
     Vercel Python serverless function handler
@@ -115,7 +118,7 @@ def handler(request):
         if hasattr(result, 'close'):
             result.close()
         
-        response_body = b''.join(response_body_parts).decode('utf-8')
+        response_body = b''.join(response_body_parts)
         
         # Build response headers dict
         headers_dict = {}
@@ -126,10 +129,21 @@ def handler(request):
         if 'Access-Control-Allow-Origin' not in headers_dict:
             headers_dict['Access-Control-Allow-Origin'] = '*'
         
+        # Negotiated binary bodies (MessagePack, gzip/brotli, images) go back base64-encoded
+        content_type = headers_dict.get('Content-Type', '')
+        if 'Content-Encoding' in headers_dict or not content_type.startswith(TEXT_CONTENT_TYPES):
+            import base64
+            return {
+                'statusCode': status_code[0],
+                'headers': headers_dict,
+                'body': base64.b64encode(response_body).decode('ascii'),
+                'isBase64Encoded': True
+            }
+        
         return {
             'statusCode': status_code[0],
             'headers': headers_dict,
-            'body': response_body
+            'body': response_body.decode('utf-8')
         }
         
     except Exception as e:
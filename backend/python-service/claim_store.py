@@ -0,0 +1,180 @@
+"""
+Persistent claim result store
+SQLite-backed record of every processed claim: inputs hash, per-stage outputs,
+timings and final decision. Lets repeat requests skip the Earth Engine pipeline
+and makes historic decisions queryable in bulk.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+STORE_PATH = os.getenv(
+    'CLAIM_STORE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'claims.db')
+)
+# Stored results older than this are recomputed (seconds, 0 = always recompute)
+DEFAULT_MAX_AGE = int(os.getenv('CLAIM_STORE_MAX_AGE', 7 * 24 * 3600))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS claims (
+    claim_key    TEXT PRIMARY KEY,
+    inputs       TEXT NOT NULL,
+    stages       TEXT NOT NULL,
+    timings      TEXT NOT NULL,
+    response     TEXT NOT NULL,
+    hazard       TEXT,
+    claim_status TEXT,
+    fused_score  REAL,
+    min_lon      REAL,
+    min_lat      REAL,
+    max_lon      REAL,
+    max_lat      REAL,
+    event_date   TEXT,
+    created_at   REAL NOT NULL,
+    hits         INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_claims_bounds ON claims (min_lon, max_lon, min_lat, max_lat);
+CREATE INDEX IF NOT EXISTS idx_claims_event_date ON claims (event_date);
+CREATE INDEX IF NOT EXISTS idx_claims_status ON claims (claim_status);
+"""
+
+_initialized = False
+
+
+def _connect():
+    global _initialized
+    os.makedirs(os.path.dirname(STORE_PATH) or '.', exist_ok=True)
+    conn = sqlite3.connect(STORE_PATH, timeout=10)
+    conn.row_factory = sqlite3.Row
+    if not _initialized:
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        _initialized = True
+    return conn
+
+
+def claim_key(inputs):
+    """Stable hash of the claim request (key order and whitespace independent)"""
+    canonical = json.dumps(inputs, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def get_claim(key, max_age=None):
+    """Return the stored response for `key`, or None if missing or older than `max_age` seconds"""
+    max_age = DEFAULT_MAX_AGE if max_age is None else max_age
+    conn = _connect()
+    try:
+        row = conn.execute(
+            'SELECT response, created_at FROM claims WHERE claim_key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if time.time() - row['created_at'] >= max_age:
+            return None
+        conn.execute('UPDATE claims SET hits = hits + 1 WHERE claim_key = ?', (key,))
+        conn.commit()
+        return json.loads(row['response'])
+    finally:
+        conn.close()
+
+
+def put_claim(key, inputs, stages, timings, response, bounds=None, event_date=None):
+    """Insert or replace the stored result for `key`"""
+    claim = response.get('claim', {})
+    bounds = bounds or [None, None, None, None]
+    conn = _connect()
+    try:
+        conn.execute(
+            """INSERT OR REPLACE INTO claims
+               (claim_key, inputs, stages, timings, response, hazard, claim_status,
+                fused_score, min_lon, min_lat, max_lon, max_lat, event_date, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                key,
+                json.dumps(inputs, default=str),
+                json.dumps(stages, default=str),
+                json.dumps(timings),
+                json.dumps(response, default=str),
+                claim.get('hazard'),
+                claim.get('claim_status'),
+                claim.get('fused_score'),
+                bounds[0], bounds[1], bounds[2], bounds[3],
+                event_date,
+                time.time()
+            )
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def query_claims(bbox=None, date_from=None, date_to=None, status=None, hazard=None,
+                 limit=100, offset=0):
+    """Bulk query of stored decisions by AOI overlap, event date and outcome"""
+    clauses = []
+    args = []
+    if bbox:
+        # Stored AOI intersects the query bbox
+        clauses.append('max_lon >= ? AND min_lon <= ? AND max_lat >= ? AND min_lat <= ?')
+        args.extend([bbox[0], bbox[2], bbox[1], bbox[3]])
+    if date_from:
+        clauses.append('event_date >= ?')
+        args.append(date_from)
+    if date_to:
+        clauses.append('event_date <= ?')
+        args.append(date_to)
+    if status:
+        clauses.append('claim_status = ?')
+        args.append(status)
+    if hazard:
+        clauses.append('hazard = ?')
+        args.append(hazard)
+
+    sql = ('SELECT claim_key, hazard, claim_status, fused_score, min_lon, min_lat, '
+           'max_lon, max_lat, event_date, created_at, timings, hits FROM claims')
+    if clauses:
+        sql += ' WHERE ' + ' AND '.join(clauses)
+    sql += ' ORDER BY event_date DESC, created_at DESC LIMIT ? OFFSET ?'
+    args.extend([int(limit), int(offset)])
+
+    conn = _connect()
+    try:
+        rows = conn.execute(sql, args).fetchall()
+    finally:
+        conn.close()
+
+    return [{
+        'claim_key': r['claim_key'],
+        'hazard': r['hazard'],
+        'claim_status': r['claim_status'],
+        'fused_score': r['fused_score'],
+        'bounds': [r['min_lon'], r['min_lat'], r['max_lon'], r['max_lat']],
+        'event_date': r['event_date'],
+        'created_at': r['created_at'],
+        'timings': json.loads(r['timings']),
+        'hits': r['hits']
+    } for r in rows]
+
+
+def get_claim_record(key):
+    """Full stored record (inputs, stage outputs, timings, response) for audits"""
+    conn = _connect()
+    try:
+        row = conn.execute('SELECT * FROM claims WHERE claim_key = ?', (key,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    return {
+        'claim_key': row['claim_key'],
+        'inputs': json.loads(row['inputs']),
+        'stages': json.loads(row['stages']),
+        'timings': json.loads(row['timings']),
+        'response': json.loads(row['response']),
+        'event_date': row['event_date'],
+        'created_at': row['created_at'],
+        'hits': row['hits']
+    }
@@ -8,14 +8,29 @@ Exposes REST API for Node.js backend to call
 import os
 import json
 import ee
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
 from dotenv import load_dotenv
+from tiling import tiled_mean, aoi_bounds, check_deadline
+import claim_store
+from imagery import aoi_to_geometry, build_composite, IMERG_DATASET
+import thumbnails
+import timeseries
+import shared_cache
+import parametric
+import ee_memo
+import embedding_index
+import profiling
+import encoding
 
 load_dotenv()
 app = Flask(__name__)
 CORS(app)  # Allow requests from Node.js backend
+profiling.init_app(app)
+encoding.init_app(app)
 
 # Initialize Earth Engine
 try:
@@ -36,18 +51,6 @@ except Exception as e:
     # Don't fail - let individual requests handle errors
 
 
-def aoi_to_geometry(aoi):
-    """Convert AOI to Earth Engine Geometry"""
-    if isinstance(aoi, list) and len(aoi) == 4:
-        # Bounding box [minLon, minLat, maxLon, maxLat]
-        return ee.Geometry.Rectangle(aoi)
-    elif isinstance(aoi, dict) and 'type' in aoi:
-        # GeoJSON geometry
-        return ee.Geometry(aoi)
-    else:
-        raise ValueError(f"Unsupported AOI type: {type(aoi)}")
-
-
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
@@ -62,127 +65,11 @@ def health():
 def get_imagery():
     """Get satellite imagery for AOI and date range"""
     try:
-        data = request.json
-        aoi = data['aoi']
-        start_date = data['startDate']
-        end_date = data['endDate']
-        satellite = data.get('satellite', 'sentinel2')
-        max_cloud = data.get('maxCloud', 30)
-        reducer = data.get('reducer', 'median')
-        
-        geom = aoi_to_geometry(aoi)
-        sat = satellite.lower()
-        
-        # Define datasets
-        if sat == 'sentinel2':
-            dataset = 'COPERNICUS/S2_SR_HARMONIZED'
-            collection = (ee.ImageCollection(dataset)
-                         .filterBounds(geom)
-                         .filterDate(start_date, end_date)
-                         .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', max_cloud)))
-            # Mask clouds using SCL band
-            def mask_s2(img):
-                scl = img.select('SCL')
-                mask = (scl.neq(3).And(scl.neq(7)).And(scl.neq(8))
-                       .And(scl.neq(9)).And(scl.neq(10)).And(scl.neq(11)))
-                scaled = img.divide(10000)
-                return scaled.updateMask(mask)
-            collection = collection.map(mask_s2)
-            default_bands = ['B4', 'B3', 'B2']
-            default_min = 0.02
-            default_max = 0.3
-            
-        elif sat == 'landsat8':
-            dataset = 'LANDSAT/LC08/C02/T1_L2'
-            collection = (ee.ImageCollection(dataset)
-                         .filterBounds(geom)
-                         .filterDate(start_date, end_date))
-            def mask_landsat(img):
-                qa = img.select('QA_PIXEL')
-                mask = (qa.bitwiseAnd(1 << 1).neq(0)
-                       .Or(qa.bitwiseAnd(1 << 2).neq(0))
-                       .Or(qa.bitwiseAnd(1 << 3).neq(0))
-                       .Or(qa.bitwiseAnd(1 << 4).neq(0))
-                       .Or(qa.bitwiseAnd(1 << 5).neq(0))).Not()
-                sr_bands = ['SR_B1', 'SR_B2', 'SR_B3', 'SR_B4', 'SR_B5', 'SR_B6', 'SR_B7']
-                sr = img.select(sr_bands).divide(10000)
-                return sr.updateMask(mask)
-            collection = collection.map(mask_landsat)
-            default_bands = ['SR_B4', 'SR_B3', 'SR_B2']
-            default_min = 0.02
-            default_max = 0.3
-            
-        elif sat == 'landsat9':
-            dataset = 'LANDSAT/LC09/C02/T1_L2'
-            collection = (ee.ImageCollection(dataset)
-                         .filterBounds(geom)
-                         .filterDate(start_date, end_date))
-            def mask_landsat(img):
-                qa = img.select('QA_PIXEL')
-                mask = (qa.bitwiseAnd(1 << 1).neq(0)
-                       .Or(qa.bitwiseAnd(1 << 2).neq(0))
-                       .Or(qa.bitwiseAnd(1 << 3).neq(0))
-                       .Or(qa.bitwiseAnd(1 << 4).neq(0))
-                       .Or(qa.bitwiseAnd(1 << 5).neq(0))).Not()
-                sr_bands = ['SR_B1', 'SR_B2', 'SR_B3', 'SR_B4', 'SR_B5', 'SR_B6', 'SR_B7']
-                sr = img.select(sr_bands).divide(10000)
-                return sr.updateMask(mask)
-            collection = collection.map(mask_landsat)
-            default_bands = ['SR_B4', 'SR_B3', 'SR_B2']
-            default_min = 0.02
-            default_max = 0.3
-            
-        elif sat == 'modis':
-            dataset = 'MODIS/061/MOD09GA'
-            collection = (ee.ImageCollection(dataset)
-                         .filterBounds(geom)
-                         .filterDate(start_date, end_date))
-            def scale_modis(img):
-                sr_bands = ['sur_refl_b01', 'sur_refl_b02', 'sur_refl_b03', 'sur_refl_b04']
-                sr = img.select(sr_bands).multiply(0.0001)
-                return sr
-            collection = collection.map(scale_modis)
-            default_bands = ['sur_refl_b01', 'sur_refl_b04', 'sur_refl_b03']
-            default_min = 0.02
-            default_max = 0.3
-        else:
-            raise ValueError(f"Unsupported satellite: {satellite}")
-        
-        # Reduce collection
-        if reducer == 'median':
-            image = collection.median().clip(geom)
-        elif reducer == 'mosaic':
-            image = collection.mosaic().clip(geom)
-        else:
-            raise ValueError(f"Unsupported reducer: {reducer}")
-        
-        # Check if image has bands
-        bands = image.bandNames().getInfo()
-        if not bands:
-            raise ValueError(f"No usable imagery found for date range {start_date} to {end_date}")
-        
-        # Get map ID for tile URL
-        vis_params = {
-            'bands': default_bands,
-            'min': default_min,
-            'max': default_max
-        }
-        map_id = image.getMapId(vis_params)
+        result = get_imagery_internal(request.json)
+        if not result['success']:
+            raise ValueError(result['error'])
         
-        # Build tile URL template
-        url_template = (f"https://earthengine.googleapis.com/map/{map_id['mapid']}"
-                       f"/{{z}}/{{x}}/{{y}}?token={map_id['token']}")
-        
-        return jsonify({
-            'success': True,
-            'image': {
-                'bands': bands,
-                'dataset': dataset
-            },
-            'vis_params': vis_params,
-            'url_template': url_template,
-            'map_id': map_id
-        })
+        return jsonify(result)
         
     except Exception as e:
         print(f"Error in get_imagery: {e}")
@@ -251,8 +138,12 @@ def validate():
         post_date = data['postDate']
         hazard = data.get('hazard', 'flood')
         scale = data.get('scale', 30)
+        budget_ms = data.get('budget_ms')
         
-        validation_result = validate_claim_logic(aoi, pre_date, post_date, hazard, scale)
+        validation_result = validate_claim_logic(
+            aoi, pre_date, post_date, hazard, scale,
+            budget=budget_ms / 1000.0 if budget_ms is not None else None
+        )
         
         return jsonify({
             'success': True,
@@ -277,11 +168,31 @@ def process_claim():
         hazard_cfg = data.get('hazard', {})
         claim_cfg = data.get('claim', {})
         
+        # Serve repeat requests from the claim store unless a refresh is forced
+        inputs = {'preprocessing': preprocessing, 'hazard': hazard_cfg, 'claim': claim_cfg}
+        key = claim_store.claim_key(inputs)
+        force_refresh = (data.get('force_refresh', False)
+                         or request.args.get('refresh', '').lower() in ('1', 'true'))
+        if not force_refresh:
+            try:
+                stored = claim_store.get_claim(key, max_age=data.get('max_age'))
+                if stored is not None:
+                    # Stored tile URLs carry map tokens that expire long before the
+                    # decision does, so re-issue them; recompute if that fails
+                    stored = refresh_stored_imagery(stored, preprocessing)
+                if stored is not None:
+                    print(f"📦 Serving claim {key[:12]} from store")
+                    return jsonify({**stored, 'claim_key': key, 'cached': True})
+            except Exception as e:
+                print(f"⚠️  Claim store lookup failed: {e}")
+        timings = {}
+        
         aoi = preprocessing['aoi']
         geom = aoi_to_geometry(aoi)
         satellite = preprocessing.get('satellite', 'sentinel2')
         max_cloud = preprocessing.get('max_cloud', 30)
         reducer = preprocessing.get('reducer', 'median')
+        max_scenes = preprocessing.get('max_scenes')
         
         # Get pre and post imagery
         pre_start = preprocessing['pre']['start']
@@ -292,13 +203,16 @@ def process_claim():
         print(f"Processing claim: AOI={aoi}, Pre={pre_start} to {pre_end}, Post={post_start} to {post_end}")
         
         # Get pre-event imagery
+        profiling.set_stage('imagery')
+        t0 = time.perf_counter()
         pre_imagery_data = {
             'aoi': aoi,
             'startDate': pre_start,
             'endDate': pre_end,
             'satellite': satellite,
             'maxCloud': max_cloud,
-            'reducer': reducer
+            'reducer': reducer,
+            'maxScenes': max_scenes
         }
         pre_result = get_imagery_internal(pre_imagery_data)
         if not pre_result['success']:
@@ -311,16 +225,20 @@ def process_claim():
             'endDate': post_end,
             'satellite': satellite,
             'maxCloud': max_cloud,
-            'reducer': reducer
+            'reducer': reducer,
+            'maxScenes': max_scenes
         }
         post_result = get_imagery_internal(post_imagery_data)
         if not post_result['success']:
             raise Exception(f"Failed to get post-event imagery: {post_result.get('error')}")
+        timings['imagery'] = round(time.perf_counter() - t0, 3)
         
         # Detect hazard
         hazard_type = hazard_cfg.get('hazard', 'flood')
         scale = hazard_cfg.get('scale', 30)
         
+        profiling.set_stage('hazard')
+        t0 = time.perf_counter()
         hazard_result = detect_hazard_internal(
             hazard_type,
             pre_result,
@@ -329,15 +247,23 @@ def process_claim():
             scale
         )
         
+        timings['hazard'] = round(time.perf_counter() - t0, 3)
+        
         # Validate claim
+        profiling.set_stage('validation')
+        t0 = time.perf_counter()
+        budget_ms = claim_cfg.get('budget_ms', data.get('budget_ms'))
         validation_result = validate_internal(
             aoi,
             pre_start,
             post_end,
             hazard_type,
-            scale
+            scale,
+            budget=budget_ms / 1000.0 if budget_ms is not None else None
         )
+        timings['validation'] = round(time.perf_counter() - t0, 3)
         
+        profiling.set_stage('decision')
         # ===== FULL CLAIM DECISION LOGIC (matching old Inception output) =====
         damage_pct = float(hazard_result.get('damage_pct', 0))
         severity = hazard_result.get('severity', 'unknown')
@@ -350,9 +276,8 @@ def process_claim():
         cross_sensor = float(validation_data.get('cross_sensor', 0.0)) / 100.0
         spatial_coherence = float(validation_data.get('spatial_coherence', 0.0)) / 100.0
         
-        # Embedding change (placeholder - would come from actual embedding service)
-        # In production, this would be calculated from AlphaEarth embeddings
-        embedding_change = round(0.5 + (damage_pct / 200.0), 2)  # Simulated based on damage
+        # Embedding change from the local AlphaEarth embedding index
+        embedding_change = embedding_change_internal(aoi, pre_start, post_start, damage_pct)
         
         # Compute fused score (EXACT same logic as Node.js claimDecisionService.js)
         if confidence_score < 0.45:
@@ -387,6 +312,11 @@ def process_claim():
         else:
             claim_status = 'Reject'
         
+        # Validation that ran out of budget or failed can't auto-approve
+        validation_partial = validation_data.get('partial', False)
+        if validation_partial and claim_status == 'Auto-Approve':
+            claim_status = 'Manual Review'
+        
         # Generate detailed reason text (matching old format)
         reason = (
             f"Google Earth Engine indicates {severity} {hazard_type} damage (~{damage_pct:.1f}%), "
@@ -395,6 +325,10 @@ def process_claim():
             f"Conditional fusion score {fused_score:.2f} ({fused_label}) balances severity with corroboration, "
             f"leading to a {claim_status.lower()} decision."
         )
+        if validation_partial:
+            incomplete = [name for name, status in validation_data.get('checks', {}).items()
+                          if status != 'ok']
+            reason += f" Validation was partial (incomplete checks: {', '.join(incomplete)})."
         
         # Build FULL claim object (matching old Inception output format EXACTLY)
         full_claim = {
@@ -446,7 +380,29 @@ def process_claim():
             # Don't add it here to avoid duplication
         }
         
-        return jsonify(response)
+        # Record the result so retries and audits don't rerun the pipeline
+        # (partial results are not stored so a retry gets a full evaluation)
+        try:
+            if not validation_partial:
+                claim_store.put_claim(
+                    key,
+                    inputs,
+                    stages={
+                        'pre_imagery': pre_result,
+                        'post_imagery': post_result,
+                        'hazard': hazard_result,
+                        'validation': validation_data_with_embedding,
+                        'claim': full_claim
+                    },
+                    timings=timings,
+                    response=response,
+                    bounds=aoi_bounds(aoi),
+                    event_date=post_start
+                )
+        except Exception as e:
+            print(f"⚠️  Claim store write failed: {e}")
+        
+        return jsonify({**response, 'claim_key': key, 'cached': False})
         
     except Exception as e:
         print(f"Error in process_claim: {e}")
@@ -457,6 +413,230 @@ def process_claim():
         }), 500
 
 
+@app.route('/claims', methods=['GET'])
+def list_claims():
+    """Query stored claim decisions by AOI bbox, event date, status and hazard"""
+    try:
+        bbox = request.args.get('bbox')
+        claims = claim_store.query_claims(
+            bbox=[float(v) for v in bbox.split(',')] if bbox else None,
+            date_from=request.args.get('from'),
+            date_to=request.args.get('to'),
+            status=request.args.get('status'),
+            hazard=request.args.get('hazard'),
+            limit=int(request.args.get('limit', 100)),
+            offset=int(request.args.get('offset', 0))
+        )
+        return jsonify({
+            'success': True,
+            'count': len(claims),
+            'claims': claims
+        })
+        
+    except Exception as e:
+        print(f"Error in list_claims: {e}")
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/claims/<claim_key>', methods=['GET'])
+def get_claim(claim_key):
+    """Full stored record for one claim (inputs, stage outputs, timings)"""
+    try:
+        record = claim_store.get_claim_record(claim_key)
+        if record is None:
+            return jsonify({
+                'success': False,
+                'error': f'Unknown claim: {claim_key}'
+            }), 404
+        return jsonify({
+            'success': True,
+            'record': record
+        })
+        
+    except Exception as e:
+        print(f"Error in get_claim: {e}")
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/thumbnails', methods=['POST'])
+def render_thumbnails():
+    """Render pre/post/difference thumbnails for a batch of claims (disk-cached)"""
+    try:
+        data = request.json
+        claims = data['claims']
+        size = int(data.get('size', 512))
+        fmt = data.get('format', 'png').lower()
+        kinds = data.get('kinds', list(thumbnails.KINDS))
+        
+        results = thumbnails.render_batch(claims, size, fmt, kinds)
+        for r in results:
+            for thumb in r.get('thumbnails', {}).values():
+                thumb['url'] = f"/thumbnails/{thumb['file']}"
+        
+        return jsonify({
+            'success': True,
+            'results': results
+        })
+        
+    except Exception as e:
+        print(f"Error in render_thumbnails: {e}")
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/thumbnails/<path:filename>', methods=['GET'])
+def get_thumbnail(filename):
+    """Serve a rendered thumbnail from the on-disk cache"""
+    return send_from_directory(thumbnails.CACHE_DIR, filename,
+                               max_age=thumbnails.client_max_age(filename))
+
+
+@app.route('/timeseries', methods=['POST'])
+def get_timeseries():
+    """Index curves (NDVI, NDWI, S1 VV, precipitation) for one or more AOIs in one EE round trip"""
+    try:
+        data = request.json
+        aois = data.get('aois') or [{'id': data.get('id', 'aoi'), 'aoi': data['aoi']}]
+        indices = data.get('indices', ['ndvi'])
+        
+        series = timeseries.build_timeseries(
+            aois,
+            indices,
+            data['startDate'],
+            data['endDate'],
+            scale=data.get('scale'),
+            max_cloud=data.get('maxCloud', 30)
+        )
+        
+        # Stream one compact columnar record per index as NDJSON
+        if data.get('stream') or 'application/x-ndjson' in request.headers.get('Accept', ''):
+            def generate():
+                for index in indices:
+                    yield json.dumps({'index': index, **series[index]}, separators=(',', ':')) + '\n'
+            return Response(generate(), mimetype='application/x-ndjson')
+        
+        return jsonify({
+            'success': True,
+            'series': series
+        })
+        
+    except Exception as e:
+        print(f"Error in get_timeseries: {e}")
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/parametric/evaluate', methods=['POST'])
+def evaluate_parametric():
+    """Evaluate rainfall triggers for a batch of policies against one IMERG grid"""
+    try:
+        data = request.json
+        policies = data['policies']
+        
+        results = parametric.evaluate_batch(policies, data['startDate'], data['endDate'])
+        
+        return jsonify({
+            'success': True,
+            'evaluated': len(results),
+            'triggered': sum(1 for r in results if r['triggered']),
+            'results': results
+        })
+        
+    except Exception as e:
+        print(f"Error in evaluate_parametric: {e}")
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/embedding/change', methods=['POST'])
+def embedding_change():
+    """Per-AOI embedding change between two annual epochs from the local index"""
+    try:
+        data = request.json
+        change = embedding_index.aoi_change(data['aoi'], data['preEpoch'], data['postEpoch'])
+        if change is None:
+            return jsonify({
+                'success': False,
+                'error': 'No embedding index coverage for this AOI and epochs'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'change': change
+        })
+        
+    except Exception as e:
+        print(f"Error in embedding_change: {e}")
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/embedding/top-changed', methods=['POST'])
+def embedding_top_changed():
+    """Top-k most changed parcels in an event zone"""
+    try:
+        data = request.json
+        parcels = embedding_index.top_changed(
+            data['parcels'], data['preEpoch'], data['postEpoch'], data.get('k', 10))
+        
+        return jsonify({
+            'success': True,
+            'parcels': parcels
+        })
+        
+    except Exception as e:
+        print(f"Error in embedding_top_changed: {e}")
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/embedding/ingest', methods=['POST'])
+def embedding_ingest():
+    """Download embedding tiles covering an AOI for the given epochs into the local index"""
+    try:
+        data = request.json
+        fetched = {
+            str(epoch): embedding_index.ingest_aoi(data['aoi'], epoch)
+            for epoch in data['epochs']
+        }
+        
+        return jsonify({
+            'success': True,
+            'tiles_fetched': fetched
+        })
+        
+    except Exception as e:
+        print(f"Error in embedding_ingest: {e}")
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 def get_imagery_internal(params):
     """Internal function to get imagery (used by process_claim)"""
     try:
@@ -466,75 +646,31 @@ def get_imagery_internal(params):
         satellite = params.get('satellite', 'sentinel2')
         max_cloud = params.get('maxCloud', 30)
         reducer = params.get('reducer', 'median')
+        max_scenes = params.get('maxScenes')
         
-        geom = aoi_to_geometry(aoi)
-        sat = satellite.lower()
-        
-        # Define datasets (same as /get-imagery endpoint)
-        if sat == 'sentinel2':
-            dataset = 'COPERNICUS/S2_SR_HARMONIZED'
-            collection = (ee.ImageCollection(dataset)
-                         .filterBounds(geom)
-                         .filterDate(start_date, end_date)
-                         .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', max_cloud)))
-            def mask_s2(img):
-                scl = img.select('SCL')
-                mask = (scl.neq(3).And(scl.neq(7)).And(scl.neq(8))
-                       .And(scl.neq(9)).And(scl.neq(10)).And(scl.neq(11)))
-                scaled = img.divide(10000)
-                return scaled.updateMask(mask)
-            collection = collection.map(mask_s2)
-            default_bands = ['B4', 'B3', 'B2']
-            default_min = 0.02
-            default_max = 0.3
-        elif sat == 'landsat8':
-            dataset = 'LANDSAT/LC08/C02/T1_L2'
-            collection = (ee.ImageCollection(dataset)
-                         .filterBounds(geom)
-                         .filterDate(start_date, end_date))
-            def mask_landsat(img):
-                qa = img.select('QA_PIXEL')
-                mask = (qa.bitwiseAnd(1 << 1).neq(0)
-                       .Or(qa.bitwiseAnd(1 << 2).neq(0))
-                       .Or(qa.bitwiseAnd(1 << 3).neq(0))
-                       .Or(qa.bitwiseAnd(1 << 4).neq(0))
-                       .Or(qa.bitwiseAnd(1 << 5).neq(0))).Not()
-                sr_bands = ['SR_B1', 'SR_B2', 'SR_B3', 'SR_B4', 'SR_B5', 'SR_B6', 'SR_B7']
-                sr = img.select(sr_bands).divide(10000)
-                return sr.updateMask(mask)
-            collection = collection.map(mask_landsat)
-            default_bands = ['SR_B4', 'SR_B3', 'SR_B2']
-            default_min = 0.02
-            default_max = 0.3
-        else:
-            return {'success': False, 'error': f'Unsupported satellite: {satellite}'}
+        # Map IDs are shared across worker processes until they expire
+        cache_key = shared_cache.make_key(aoi, start_date, end_date, satellite, max_cloud, reducer,
+                                          max_scenes)
+        cached = shared_cache.get('imagery', cache_key)
+        if cached is not None:
+            return cached
         
-        # Reduce collection
-        if reducer == 'median':
-            image = collection.median().clip(geom)
-        elif reducer == 'mosaic':
-            image = collection.mosaic().clip(geom)
-        else:
-            return {'success': False, 'error': f'Unsupported reducer: {reducer}'}
+        image, dataset, vis_params = build_composite(
+            aoi, start_date, end_date, satellite, max_cloud, reducer, max_scenes)
         
         # Check if image has bands
-        bands = image.bandNames().getInfo()
+        bands = ee_memo.get_info(image.bandNames())
         if not bands:
             return {'success': False, 'error': f'No usable imagery found for date range {start_date} to {end_date}'}
         
         # Get map ID for tile URL
-        vis_params = {
-            'bands': default_bands,
-            'min': default_min,
-            'max': default_max
-        }
         map_id = image.getMapId(vis_params)
         
         # Build tile URL template
         url_template = (f"https://earthengine.googleapis.com/map/{map_id['mapid']}"
                        f"/{{z}}/{{x}}/{{y}}?token={map_id['token']}")
         
-        return {
+        result = {
             'success': True,
             'image': {
                 'bands': bands,
@@ -544,10 +680,37 @@ def get_imagery_internal(params):
             'url_template': url_template,
             'map_id': map_id
         }
+        shared_cache.set('imagery', cache_key, result, shared_cache.MAP_ID_TTL)
+        return result
     except Exception as e:
         return {'success': False, 'error': str(e)}
 
 
+def refresh_stored_imagery(response, preprocessing):
+    """Re-issue the preprocessing tile URLs of a stored claim response; None on failure"""
+    refreshed = {}
+    for phase in ('pre', 'post'):
+        result = get_imagery_internal({
+            'aoi': preprocessing['aoi'],
+            'startDate': preprocessing[phase]['start'],
+            'endDate': preprocessing[phase]['end'],
+            'satellite': preprocessing.get('satellite', 'sentinel2'),
+            'maxCloud': preprocessing.get('max_cloud', 30),
+            'reducer': preprocessing.get('reducer', 'median'),
+            'maxScenes': preprocessing.get('max_scenes')
+        })
+        if not result['success']:
+            print(f"⚠️  Could not refresh stored {phase}-event imagery: {result.get('error')}")
+            return None
+        refreshed[phase] = {
+            'image': result.get('image', {}),
+            'dataset': result.get('image', {}).get('dataset', ''),
+            'vis_params': result.get('vis_params', {}),
+            'url_template': result.get('url_template', '')
+        }
+    return {**response, 'preprocessing': refreshed}
+
+
 def detect_hazard_internal(hazard_type, pre_imagery, post_imagery, aoi, scale):
     """Internal function to detect hazard"""
     try:
@@ -582,133 +745,211 @@ def detect_hazard_internal(hazard_type, pre_imagery, post_imagery, aoi, scale):
         }
 
 
-def validate_internal(aoi, pre_date, post_date, hazard, scale):
+def embedding_change_internal(aoi, pre_date, post_date, damage_pct):
+    """Mean AlphaEarth embedding change over the AOI between pre and post epochs"""
+    # Embeddings are annual; when both windows fall in the same year compare
+    # against the previous year's embedding as the pre-event baseline
+    try:
+        pre_year = int(pre_date[:4])
+        post_year = int(post_date[:4])
+        if pre_year == post_year:
+            pre_year -= 1
+        change = embedding_index.aoi_change(aoi, pre_year, post_year)
+        if change is not None:
+            return round(min(change['mean_change'], 1.0), 2)
+        print(f"No embedding index coverage for {pre_year}/{post_year}, using estimate")
+    except Exception as e:
+        print(f"Embedding change failed: {e}")
+    # Fallback: estimate from damage when the index doesn't cover the AOI
+    return round(0.5 + (damage_pct / 200.0), 2)
+
+
+def validate_internal(aoi, pre_date, post_date, hazard, scale, budget=None):
     """Internal function to validate claim"""
     try:
-        return validate_claim_logic(aoi, pre_date, post_date, hazard, scale)
+        return validate_claim_logic(aoi, pre_date, post_date, hazard, scale, budget)
     except Exception as e:
         print(f"Validation failed: {e}")
-        return {
-            'validation': {
-                'cross_sensor': 0.0,
-                'meteorology': 50.0,
-                'spatial_coherence': 75.0,
-                'confidence': {
-                    'confidence_score': 0.5,
-                    'label': 'medium'
-                }
-            }
+        return fallback_validation()
+
+
+# Default per-request validation budget (seconds); checks still running when it
+# runs out are abandoned and reported as timed out
+VALIDATION_BUDGET = float(os.getenv('VALIDATION_BUDGET_S', 20))
+
+# Confidence weight and fallback value per check
+VALIDATION_CHECKS = {
+    'cross_sensor': {'weight': 0.4, 'fallback': 0.0},
+    'meteorology': {'weight': 0.3, 'fallback': 50.0},
+    'spatial_coherence': {'weight': 0.3, 'fallback': 75.0}
+}
+
+
+def fallback_validation():
+    """Default validation values when validation itself fails, flagged as partial"""
+    return {
+        'validation': {
+            **{name: spec['fallback'] for name, spec in VALIDATION_CHECKS.items()},
+            # No check completed, so nothing backs any confidence
+            'confidence': {
+                'confidence_score': 0.0,
+                'label': 'low',
+                'completeness': 0.0
+            },
+            'partial': True,
+            'checks': {name: 'failed' for name in VALIDATION_CHECKS}
         }
+    }
+
+
+def cross_sensor_check(aoi, pre_date, post_date, scale, deadline=None):
+    """Cross-sensor check using Sentinel-1"""
+    profiling.set_stage('validation.cross_sensor')
+    check_deadline(deadline)
+    geom = aoi_to_geometry(aoi)
+    s1 = (ee.ImageCollection('COPERNICUS/S1_GRD')
+         .filterBounds(geom)
+         .filter(ee.Filter.eq('instrumentMode', 'IW'))
+         .filter(ee.Filter.eq('orbitProperties_pass', 'DESCENDING'))
+         .select('VV'))
+    
+    pre_start = ee.Date(pre_date).advance(-6, 'day')
+    pre_end = ee.Date(pre_date).advance(1, 'day')
+    post_start = ee.Date(post_date)
+    post_end = ee.Date(post_date).advance(6, 'day')
+    
+    pre_coll = s1.filterDate(pre_start, pre_end)
+    post_coll = s1.filterDate(post_start, post_end)
+    
+    pre_size = ee_memo.get_info(pre_coll.size())
+    check_deadline(deadline)
+    post_size = ee_memo.get_info(post_coll.size())
+    check_deadline(deadline)
+    
+    if pre_size == 0 or post_size == 0:
+        return 0.0
+    
+    pre_s1 = pre_coll.mean()
+    post_s1 = post_coll.mean()
+    delta_s1 = post_s1.subtract(pre_s1)
+    
+    mean_delta = tiled_mean(delta_s1, aoi, scale, deadline=deadline).get('VV')
+    
+    return max(0, min(100, abs(mean_delta) * 100)) if mean_delta else 0.0
 
 
-def validate_claim_logic(aoi, pre_date, post_date, hazard, scale):
-    """Pure function for validation logic"""
+def meteorology_check(aoi, pre_date, hazard, deadline=None):
+    """Meteorology check using NASA GPM IMERG"""
+    profiling.set_stage('validation.meteorology')
+    check_deadline(deadline)
+    dataset = IMERG_DATASET
+    event_start = ee.Date(pre_date)
+    event_end = event_start.advance(3, 'day')
+    
+    event_coll = (ee.ImageCollection(dataset)
+                 .filterDate(event_start, event_end)
+                 .select('precipitation'))
+    event_val = (tiled_mean(event_coll.sum(), aoi, 10000, deadline=deadline)
+                 .get('precipitation') or 0.0)
+    check_deadline(deadline)
+    
+    baseline_start = event_start.advance(-30, 'day')
+    baseline_coll = (ee.ImageCollection(dataset)
+                    .filterDate(baseline_start, event_start)
+                    .select('precipitation'))
+    base_val = (tiled_mean(baseline_coll.mean(), aoi, 10000, deadline=deadline)
+                .get('precipitation') or 0.0)
+    
+    if base_val <= 0:
+        return 100.0 if (hazard == 'flood' and event_val > 0) else 0.0
+    anomaly_ratio = event_val / base_val
+    if hazard == 'flood':
+        return max(0, min(100, (anomaly_ratio - 1.0) * 100.0))
+    return 50.0
+
+
+def spatial_coherence_check(aoi, scale, deadline=None):
+    """Spatial coherence against low-lying terrain and historical surface water"""
+    profiling.set_stage('validation.spatial_coherence')
+    check_deadline(deadline)
+    # Static layers only depend on the AOI and scale, so share them for long
+    static_key = shared_cache.make_key(aoi, scale)
+    overlap_pct = shared_cache.get('static_layers', static_key)
+    if overlap_pct is None:
+        elevation = ee.Image('USGS/SRTMGL1_003')
+        water = ee.Image('JRC/GSW1_4/GlobalSurfaceWater').select('occurrence')
+        low_areas = elevation.lt(20)
+        historical_water = water.gt(50)
+        combined = low_areas.Or(historical_water)
+        
+        overlap_pct = next(iter(tiled_mean(combined, aoi, scale, deadline=deadline).values()),
+                           None) or 0.0
+        shared_cache.set('static_layers', static_key, overlap_pct, shared_cache.STATIC_LAYER_TTL)
+    
+    return max(0, min(100, overlap_pct * 100))
+
+
+def validate_claim_logic(aoi, pre_date, post_date, hazard, scale, budget=None):
+    """
+    Pure function for validation logic.
+    The checks run concurrently under a latency budget (seconds); checks that
+    fail or don't finish in time fall back to their defaults and are reported
+    in 'partial' / 'checks' so degraded answers are visible.
+    """
     try:
-        geom = aoi_to_geometry(aoi)
-        
-        # Cross-sensor check using Sentinel-1
-        try:
-            s1 = (ee.ImageCollection('COPERNICUS/S1_GRD')
-                 .filterBounds(geom)
-                 .filter(ee.Filter.eq('instrumentMode', 'IW'))
-                 .filter(ee.Filter.eq('orbitProperties_pass', 'DESCENDING'))
-                 .select('VV'))
-            
-            pre_start = ee.Date(pre_date).advance(-6, 'day')
-            pre_end = ee.Date(pre_date).advance(1, 'day')
-            post_start = ee.Date(post_date)
-            post_end = ee.Date(post_date).advance(6, 'day')
-            
-            pre_coll = s1.filterDate(pre_start, pre_end)
-            post_coll = s1.filterDate(post_start, post_end)
-            
-            pre_size = pre_coll.size().getInfo()
-            post_size = post_coll.size().getInfo()
-            
-            if pre_size == 0 or post_size == 0:
-                cross_sensor = 0.0
-            else:
-                pre_s1 = pre_coll.mean()
-                post_s1 = post_coll.mean()
-                delta_s1 = post_s1.subtract(pre_s1)
-                
-                mean_delta = delta_s1.reduceRegion(
-                    reducer=ee.Reducer.mean(),
-                    geometry=geom,
-                    scale=scale,
-                    maxPixels=1e7,
-                    bestEffort=True
-                ).get('VV').getInfo()
-                
-                cross_sensor = max(0, min(100, abs(mean_delta) * 100)) if mean_delta else 0.0
-        except Exception as e:
-            print(f"Cross-sensor check failed: {e}")
-            cross_sensor = 0.0
-        
-        # Meteorology check using NASA GPM IMERG
-        try:
-            dataset = 'NASA/GPM_L3/IMERG_V07'
-            event_start = ee.Date(pre_date)
-            event_end = event_start.advance(3, 'day')
-            
-            event_coll = (ee.ImageCollection(dataset)
-                         .filterDate(event_start, event_end)
-                         .select('precipitation'))
-            event_val = event_coll.sum().reduceRegion(
-                reducer=ee.Reducer.mean(),
-                geometry=geom,
-                scale=10000,
-                bestEffort=True,
-                maxPixels=1e7
-            ).get('precipitation').getInfo() or 0.0
-            
-            baseline_start = event_start.advance(-30, 'day')
-            baseline_coll = (ee.ImageCollection(dataset)
-                            .filterDate(baseline_start, event_start)
-                            .select('precipitation'))
-            base_val = baseline_coll.mean().reduceRegion(
-                reducer=ee.Reducer.mean(),
-                geometry=geom,
-                scale=10000,
-                bestEffort=True,
-                maxPixels=1e7
-            ).get('precipitation').getInfo() or 0.0
-            
-            if base_val <= 0:
-                meteorology = 100.0 if (hazard == 'flood' and event_val > 0) else 0.0
+        cache_key = shared_cache.make_key(aoi, pre_date, post_date, hazard, scale)
+        cached = shared_cache.get('validation', cache_key)
+        if cached is not None:
+            return cached
+        
+        aoi_to_geometry(aoi)
+        budget = VALIDATION_BUDGET if budget is None else float(budget)
+        deadline = time.monotonic() + budget
+        
+        # One thread per check for this request only, so stragglers from slow
+        # requests never queue new requests' checks; an abandoned check stops at
+        # its next deadline check
+        pool = ThreadPoolExecutor(max_workers=len(VALIDATION_CHECKS))
+        futures = {
+            'cross_sensor': pool.submit(
+                profiling.propagate(cross_sensor_check), aoi, pre_date, post_date, scale, deadline),
+            'meteorology': pool.submit(
+                profiling.propagate(meteorology_check), aoi, pre_date, hazard, deadline),
+            'spatial_coherence': pool.submit(
+                profiling.propagate(spatial_coherence_check), aoi, scale, deadline)
+        }
+        pool.shutdown(wait=False)
+        wait(futures.values(), timeout=max(0.0, deadline - time.monotonic()))
+        
+        values = {}
+        checks = {}
+        for name, future in futures.items():
+            if not future.done():
+                print(f"{name} check exceeded the {budget:.1f}s validation budget")
+                checks[name] = 'timeout'
+            elif future.exception() is not None:
+                error = future.exception()
+                print(f"{name} check failed: {error}")
+                checks[name] = 'timeout' if isinstance(error, TimeoutError) else 'failed'
             else:
-                anomaly_ratio = event_val / base_val
-                if hazard == 'flood':
-                    meteorology = max(0, min(100, (anomaly_ratio - 1.0) * 100.0))
-                else:
-                    meteorology = 50.0
-        except Exception as e:
-            print(f"Meteorology check failed: {e}")
-            meteorology = 50.0
-        
-        # Spatial coherence
-        try:
-            elevation = ee.Image('USGS/SRTMGL1_003')
-            water = ee.Image('JRC/GSW1_4/GlobalSurfaceWater').select('occurrence')
-            low_areas = elevation.lt(20)
-            historical_water = water.gt(50)
-            combined = low_areas.Or(historical_water)
-            
-            overlap_pct = combined.reduceRegion(
-                reducer=ee.Reducer.mean(),
-                geometry=geom,
-                scale=scale,
-                maxPixels=1e7,
-                bestEffort=True
-            ).values().get(0).getInfo() or 0.0
-            
-            spatial_coherence = max(0, min(100, overlap_pct * 100))
-        except Exception as e:
-            print(f"Spatial coherence failed: {e}")
-            spatial_coherence = 75.0
-        
-        # Confidence score
-        confidence_score = (cross_sensor * 0.4 + meteorology * 0.3 + spatial_coherence * 0.3) / 100
+                values[name] = future.result()
+                checks[name] = 'ok'
+        
+        for name, spec in VALIDATION_CHECKS.items():
+            values.setdefault(name, spec['fallback'])
+        cross_sensor = values['cross_sensor']
+        meteorology = values['meteorology']
+        spatial_coherence = values['spatial_coherence']
+        partial = any(status != 'ok' for status in checks.values())
+        # Share of the confidence weight backed by checks that actually completed
+        completeness = sum(spec['weight'] for name, spec in VALIDATION_CHECKS.items()
+                           if checks[name] == 'ok')
+        
+        # Confidence score from completed checks only: fallback values add
+        # nothing, so the score is the full-weight score scaled by completeness
+        confidence_score = sum(spec['weight'] * values[name]
+                               for name, spec in VALIDATION_CHECKS.items()
+                               if checks[name] == 'ok') / 100
         
         if confidence_score >= 0.8:
             confidence_label = 'high'
@@ -716,31 +957,31 @@ def validate_claim_logic(aoi, pre_date, post_date, hazard, scale):
             confidence_label = 'medium'
         else:
             confidence_label = 'low'
+        # Fallback values can't vouch for high confidence
+        if partial and confidence_label == 'high':
+            confidence_label = 'medium'
         
-        return {
+        result = {
             'validation': {
                 'cross_sensor': cross_sensor,
                 'meteorology': meteorology,
                 'spatial_coherence': spatial_coherence,
                 'confidence': {
                     'confidence_score': confidence_score,
-                    'label': confidence_label
-                }
+                    'label': confidence_label,
+                    'completeness': round(completeness, 2)
+                },
+                'partial': partial,
+                'checks': checks
             }
         }
+        # Don't share results that contain fallback values
+        if not partial:
+            shared_cache.set('validation', cache_key, result, shared_cache.VALIDATION_TTL)
+        return result
     except Exception as e:
         print(f"Validation logic failed: {e}")
-        return {
-            'validation': {
-                'cross_sensor': 0.0,
-                'meteorology': 50.0,
-                'spatial_coherence': 75.0,
-                'confidence': {
-                    'confidence_score': 0.5,
-                    'label': 'medium'
-                }
-            }
-        }
+        return fallback_validation()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,190 @@
+"""
+Content-addressed memoization of Earth Engine getInfo() results
+Results are keyed by a hash of the serialized computation graph, so the same
+expression built by different endpoints is only evaluated once. Backends are
+pluggable (in-process LRU, the shared on-disk cache, or both), TTLs follow the
+datasets the expression reads, and results can be recorded to / replayed from
+a JSONL file for offline tests. Only getInfo() goes through this layer: map IDs,
+thumbnail URLs and computePixels() calls still reach Earth Engine.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import shared_cache
+
+BACKEND = os.getenv('EE_MEMO_BACKEND', 'memory')  # memory | disk | tiered | off
+MEMORY_SIZE = int(os.getenv('EE_MEMO_MEMORY_SIZE', 2048))
+DEFAULT_TTL = int(os.getenv('EE_MEMO_DEFAULT_TTL', 3600))
+MODE = os.getenv('EE_MEMO_MODE', 'off')  # off | record | replay
+REPLAY_FILE = os.getenv('EE_MEMO_FILE', 'ee_replay.jsonl')
+
+# TTL (seconds) by dataset prefix; an expression gets the shortest TTL of the datasets it reads
+DATASET_TTLS = [
+    ('NASA/GPM_L3', 3600),
+    ('COPERNICUS/S1_GRD', 6 * 3600),
+    ('COPERNICUS/S2', 6 * 3600),
+    ('LANDSAT/', 6 * 3600),
+    ('MODIS/', 6 * 3600),
+    ('USGS/SRTMGL1_003', 30 * 24 * 3600),
+    ('JRC/GSW', 30 * 24 * 3600)
+]
+
+
+class MemoryBackend:
+    """Thread-safe in-process LRU with per-entry expiry"""
+
+    def __init__(self, max_size=MEMORY_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (value, time.time() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+
+class DiskBackend:
+    """Cross-process backend stored in the shared on-disk cache"""
+
+    namespace = 'ee_memo'
+
+    def get(self, key):
+        return shared_cache.get(self.namespace, key)
+
+    def get_entry(self, key):
+        """(value, expires_at) or None"""
+        return shared_cache.get_entry(self.namespace, key)
+
+    def set(self, key, value, ttl):
+        shared_cache.set(self.namespace, key, value, ttl)
+
+
+class TieredBackend:
+    """Memory in front of disk; disk hits are promoted to memory for their remaining TTL"""
+
+    def __init__(self):
+        self.memory = MemoryBackend()
+        self.disk = DiskBackend()
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None:
+            entry = self.disk.get_entry(key)
+            if entry is not None:
+                value, expires_at = entry
+                self.memory.set(key, value, expires_at - time.time())
+        return value
+
+    def set(self, key, value, ttl):
+        self.memory.set(key, value, ttl)
+        self.disk.set(key, value, ttl)
+
+
+def make_backend(name):
+    if name == 'memory':
+        return MemoryBackend()
+    if name == 'disk':
+        return DiskBackend()
+    if name == 'tiered':
+        return TieredBackend()
+    if name == 'off':
+        return None
+    raise ValueError(f"Unsupported EE memo backend: {name}")
+
+
+_backend = make_backend(BACKEND)
+_replay = None
+_record_lock = threading.Lock()
+_recorded = set()
+
+
+def set_backend(backend):
+    """Swap the active backend (any object with get(key) / set(key, value, ttl))"""
+    global _backend
+    _backend = backend
+
+
+def expression_key(serialized):
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+def ttl_for(serialized):
+    """Shortest TTL among the datasets referenced by the expression"""
+    ttls = [ttl for prefix, ttl in DATASET_TTLS if prefix in serialized]
+    return min(ttls) if ttls else DEFAULT_TTL
+
+
+def _load_replay():
+    global _replay
+    if _replay is None:
+        _replay = {}
+        if os.path.exists(REPLAY_FILE):
+            with open(REPLAY_FILE) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        _replay[entry['key']] = entry['value']
+    return _replay
+
+
+def _record(key, value):
+    with _record_lock:
+        if key in _recorded:
+            return
+        _recorded.add(key)
+        with open(REPLAY_FILE, 'a') as f:
+            f.write(json.dumps({'key': key, 'value': value}, default=str) + '\n')
+
+
+def is_empty(value):
+    """
+    Results that usually mean "no data yet" (empty list/dict, zero count, all-null
+    reduction) rather than a settled answer
+    """
+    if value is None or value == 0 or value == [] or value == {}:
+        return True
+    return isinstance(value, dict) and all(v is None for v in value.values())
+
+
+def get_info(obj):
+    """Memoized obj.getInfo() keyed by the serialized computation graph"""
+    serialized = obj.serialize()
+    key = expression_key(serialized)
+
+    if MODE == 'replay':
+        replay = _load_replay()
+        if key not in replay:
+            raise KeyError(f"No recorded Earth Engine result for expression {key[:12]}")
+        return replay[key]
+
+    value = _backend.get(key) if _backend is not None else None
+    if value is None:
+        value = obj.getInfo()
+        # Empty results aren't memoized: scenes still being ingested would
+        # otherwise stay invisible for the dataset's whole TTL
+        if _backend is not None and not is_empty(value):
+            _backend.set(key, value, ttl_for(serialized))
+
+    if MODE == 'record':
+        _record(key, value)
+    return value
@@ -0,0 +1,295 @@
+"""
+Local AlphaEarth embedding index
+Per-pixel 64-dim embeddings (GOOGLE/SATELLITE_EMBEDDING/V1/ANNUAL) stored as
+float16 .npy tiles on a global 10 m lat/lon grid and read back memory-mapped.
+Pre/post cosine change is computed per pixel with NumPy and aggregated per AOI;
+portfolio queries (top-k most changed parcels) only touch the tiles the parcels
+fall in, and use per-tile summed-area tables (cached per epoch pair) so each
+parcel costs O(1) per tile it overlaps.
+"""
+
+import math
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import ee
+import numpy as np
+
+from tiling import aoi_bounds
+
+INDEX_DIR = os.getenv(
+    'EMBEDDING_INDEX_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'embeddings')
+)
+EMBEDDING_DATASET = 'GOOGLE/SATELLITE_EMBEDDING/V1/ANNUAL'
+DIM = 64
+TILE_PX = 256
+# ~10 m at the equator, matching the embedding dataset's native resolution
+RES_DEG = 1.0 / 11132.0
+EMBEDDING_BANDS = [f"A{i:02d}" for i in range(DIM)]
+# Upper bound on the change map built for one query (~200 MB of float32)
+MAX_ZONE_PIXELS = int(os.getenv('EMBEDDING_MAX_ZONE_PIXELS', 50_000_000))
+# Memory-mapped tiles kept open; each holds a file descriptor
+TILE_CACHE_SIZE = int(os.getenv('EMBEDDING_TILE_CACHE_SIZE', 256))
+# Per-tile change summed-area tables kept per worker (~0.8 MB each)
+CHANGE_CACHE_SIZE = int(os.getenv('EMBEDDING_CHANGE_CACHE_SIZE', 128))
+# Most tiles one top-changed query may touch, same pixel budget as a change map
+MAX_QUERY_TILES = max(1, MAX_ZONE_PIXELS // (TILE_PX * TILE_PX))
+# Most tiles one ingest call downloads (one computePixels call each)
+MAX_INGEST_TILES = int(os.getenv('EMBEDDING_MAX_INGEST_TILES', 64))
+
+
+def pixel_xy(lon, lat):
+    """Global pixel column/row for a coordinate"""
+    return int(math.floor((lon + 180.0) / RES_DEG)), int(math.floor((90.0 - lat) / RES_DEG))
+
+
+def pixel_window(bounds):
+    """Inclusive-exclusive pixel window (x0, y0, x1, y1) covering a bbox"""
+    min_lon, min_lat, max_lon, max_lat = bounds
+    x0, y0 = pixel_xy(min_lon, max_lat)
+    x1, y1 = pixel_xy(max_lon, min_lat)
+    return x0, y0, x1 + 1, y1 + 1
+
+
+def tile_path(epoch, tx, ty):
+    return os.path.join(INDEX_DIR, str(epoch), f"tile_{tx}_{ty}.npy")
+
+
+# LRU of open tiles; evicted memmaps are closed once the last reference goes
+_tile_cache = OrderedDict()
+# LRU of (sums, counts) summed-area tables per (pre, post, tx, ty)
+_change_cache = OrderedDict()
+_tile_lock = threading.Lock()
+
+
+def load_tile(epoch, tx, ty):
+    """Memory-mapped (TILE_PX, TILE_PX, DIM) float16 tile, or None if not ingested"""
+    key = (str(epoch), tx, ty)
+    with _tile_lock:
+        tile = _tile_cache.get(key)
+        if tile is not None:
+            _tile_cache.move_to_end(key)
+            return tile
+    path = tile_path(epoch, tx, ty)
+    # Missing tiles aren't cached so tiles ingested by other workers show up
+    if not os.path.exists(path):
+        return None
+    tile = np.load(path, mmap_mode='r')
+    with _tile_lock:
+        _tile_cache[key] = tile
+        _tile_cache.move_to_end(key)
+        while len(_tile_cache) > TILE_CACHE_SIZE:
+            _tile_cache.popitem(last=False)
+    return tile
+
+
+def cosine_change(pre, post):
+    """1 - cosine similarity per pixel for (..., DIM) arrays; NaN where either vector is empty"""
+    pre = pre.astype(np.float32)
+    post = post.astype(np.float32)
+    dot = np.einsum('...d,...d->...', pre, post)
+    norms = np.linalg.norm(pre, axis=-1) * np.linalg.norm(post, axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        change = 1.0 - dot / norms
+    change[norms == 0] = np.nan
+    return np.clip(change, 0.0, 2.0)
+
+
+def change_map(bounds, pre_epoch, post_epoch):
+    """
+    Per-pixel change over a bbox as a float32 (rows, cols) array (NaN where
+    either epoch has no data), plus the window origin (x0, y0).
+    Works tile by tile so only one tile pair is in memory at a time.
+    """
+    x0, y0, x1, y1 = pixel_window(bounds)
+    if (x1 - x0) * (y1 - y0) > MAX_ZONE_PIXELS:
+        raise ValueError(f"Query zone too large: {(x1 - x0) * (y1 - y0)} pixels "
+                         f"(max {MAX_ZONE_PIXELS})")
+    out = np.full((y1 - y0, x1 - x0), np.nan, dtype=np.float32)
+
+    for ty in range(y0 // TILE_PX, (y1 - 1) // TILE_PX + 1):
+        for tx in range(x0 // TILE_PX, (x1 - 1) // TILE_PX + 1):
+            pre = load_tile(pre_epoch, tx, ty)
+            post = load_tile(post_epoch, tx, ty)
+            if pre is None or post is None:
+                continue
+            # Overlap of this tile with the window, in global pixels
+            gx0, gy0 = max(x0, tx * TILE_PX), max(y0, ty * TILE_PX)
+            gx1, gy1 = min(x1, (tx + 1) * TILE_PX), min(y1, (ty + 1) * TILE_PX)
+            sl = (slice(gy0 - ty * TILE_PX, gy1 - ty * TILE_PX),
+                  slice(gx0 - tx * TILE_PX, gx1 - tx * TILE_PX))
+            out[gy0 - y0:gy1 - y0, gx0 - x0:gx1 - x0] = cosine_change(pre[sl], post[sl])
+    return out, (x0, y0)
+
+
+def aoi_change(aoi, pre_epoch, post_epoch):
+    """Aggregate embedding change over an AOI bbox; None if the index has no coverage"""
+    change, _ = change_map(aoi_bounds(aoi), pre_epoch, post_epoch)
+    valid = change[~np.isnan(change)]
+    if valid.size == 0:
+        return None
+    return {
+        'mean_change': float(valid.mean()),
+        'p90_change': float(np.percentile(valid, 90)),
+        'valid_pixels': int(valid.size),
+        'coverage': float(valid.size / change.size)
+    }
+
+
+def _integral(values):
+    # Zero-padded summed-area table so window sums need no edge cases
+    table = np.zeros((values.shape[0] + 1, values.shape[1] + 1), dtype=np.float64)
+    table[1:, 1:] = values.cumsum(axis=0).cumsum(axis=1)
+    return table
+
+
+def tile_change_tables(pre_epoch, post_epoch, tx, ty):
+    """
+    Zero-padded summed-area tables (sums, counts) of one tile's change map, or
+    None if either epoch's tile is missing. Cached per epoch pair.
+    """
+    key = (str(pre_epoch), str(post_epoch), tx, ty)
+    with _tile_lock:
+        tables = _change_cache.get(key)
+        if tables is not None:
+            _change_cache.move_to_end(key)
+            return tables
+    pre = load_tile(pre_epoch, tx, ty)
+    post = load_tile(post_epoch, tx, ty)
+    if pre is None or post is None:
+        return None
+    change = cosine_change(pre, post)
+    valid = ~np.isnan(change)
+    tables = (_integral(np.where(valid, change, 0.0)),
+              _integral(valid.astype(np.float64)).astype(np.int32))
+    with _tile_lock:
+        _change_cache[key] = tables
+        _change_cache.move_to_end(key)
+        while len(_change_cache) > CHANGE_CACHE_SIZE:
+            _change_cache.popitem(last=False)
+    return tables
+
+
+def parcel_windows(parcels):
+    """Global pixel windows (x0, y0, x1, y1) of the parcels' bboxes as int arrays"""
+    boxes = np.array([aoi_bounds(p['aoi']) for p in parcels], dtype=np.float64).reshape(-1, 4)
+    x0 = np.floor((boxes[:, 0] + 180.0) / RES_DEG).astype(np.int64)
+    x1 = np.floor((boxes[:, 2] + 180.0) / RES_DEG).astype(np.int64) + 1
+    y0 = np.floor((90.0 - boxes[:, 3]) / RES_DEG).astype(np.int64)
+    y1 = np.floor((90.0 - boxes[:, 1]) / RES_DEG).astype(np.int64) + 1
+    return x0, y0, x1, y1
+
+
+def top_changed(parcels, pre_epoch, post_epoch, k=10):
+    """
+    Top-k parcels ({id, aoi}) by mean embedding change.
+    Parcels are grouped by the tiles they overlap, so only those tiles are
+    read; per-parcel sums come from each tile's summed-area tables with
+    vectorized lookups.
+    """
+    if not parcels:
+        return []
+    x0, y0, x1, y1 = parcel_windows(parcels)
+
+    # (parcel, tile) pairs for every tile a parcel overlaps
+    pairs = {}
+    for i in range(len(parcels)):
+        for ty in range(y0[i] // TILE_PX, (y1[i] - 1) // TILE_PX + 1):
+            for tx in range(x0[i] // TILE_PX, (x1[i] - 1) // TILE_PX + 1):
+                pairs.setdefault((int(tx), int(ty)), []).append(i)
+                if len(pairs) > MAX_QUERY_TILES:
+                    raise ValueError(f"Parcels span more than {MAX_QUERY_TILES} tiles")
+
+    total = np.zeros(len(parcels), dtype=np.float64)
+    n = np.zeros(len(parcels), dtype=np.int64)
+    for (tx, ty), members in pairs.items():
+        tables = tile_change_tables(pre_epoch, post_epoch, tx, ty)
+        if tables is None:
+            continue
+        sums, counts = tables
+        idx = np.array(members)
+        # Parcel windows clipped to this tile, in tile-local pixels
+        lx0 = np.clip(x0[idx] - tx * TILE_PX, 0, TILE_PX)
+        lx1 = np.clip(x1[idx] - tx * TILE_PX, 0, TILE_PX)
+        ly0 = np.clip(y0[idx] - ty * TILE_PX, 0, TILE_PX)
+        ly1 = np.clip(y1[idx] - ty * TILE_PX, 0, TILE_PX)
+
+        def window_sum(table):
+            return table[ly1, lx1] - table[ly0, lx1] - table[ly1, lx0] + table[ly0, lx0]
+
+        np.add.at(total, idx, window_sum(sums))
+        np.add.at(n, idx, window_sum(counts))
+
+    means = np.where(n > 0, total / np.maximum(n, 1), -np.inf)
+
+    k = min(int(k), len(parcels))
+    top = np.argpartition(-means, k - 1)[:k]
+    top = top[np.argsort(-means[top])]
+    return [{
+        'id': parcels[i].get('id', int(i)),
+        'mean_change': float(means[i]) if np.isfinite(means[i]) else None,
+        'valid_pixels': int(n[i])
+    } for i in top]
+
+
+def ingest_tile(epoch, tx, ty):
+    """Download one tile of annual embeddings from Earth Engine into the index"""
+    year = int(epoch)
+    image = (ee.ImageCollection(EMBEDDING_DATASET)
+             .filterDate(f"{year}-01-01", f"{year + 1}-01-01")
+             .mosaic()
+             .select(EMBEDDING_BANDS)
+             .unmask(0))
+    pixels = ee.data.computePixels({
+        'expression': image,
+        'fileFormat': 'NUMPY_NDARRAY',
+        'grid': {
+            'dimensions': {'width': TILE_PX, 'height': TILE_PX},
+            'affineTransform': {
+                'scaleX': RES_DEG,
+                'shearX': 0,
+                'translateX': tx * TILE_PX * RES_DEG - 180.0,
+                'shearY': 0,
+                'scaleY': -RES_DEG,
+                'translateY': 90.0 - ty * TILE_PX * RES_DEG
+            },
+            'crsCode': 'EPSG:4326'
+        }
+    })
+    tile = np.stack([pixels[b] for b in EMBEDDING_BANDS], axis=-1).astype(np.float16)
+
+    path = tile_path(epoch, tx, ty)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Unique temp file so concurrent ingests of the same tile don't clash
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.tmp',
+                                     delete=False) as f:
+        np.save(f, tile)
+    os.replace(f.name, path)
+    with _tile_lock:
+        _tile_cache.pop((str(epoch), tx, ty), None)
+        for key in [k for k in _change_cache if (k[2], k[3]) == (tx, ty)
+                    and str(epoch) in (k[0], k[1])]:
+            del _change_cache[key]
+    return path
+
+
+def ingest_aoi(aoi, epoch):
+    """
+    Ingest every missing tile covering an AOI for one epoch; returns tiles fetched.
+    Raises ValueError if the AOI spans more than MAX_INGEST_TILES tiles.
+    """
+    x0, y0, x1, y1 = pixel_window(aoi_bounds(aoi))
+    n_tiles = ((y1 - 1) // TILE_PX - y0 // TILE_PX + 1) * ((x1 - 1) // TILE_PX - x0 // TILE_PX + 1)
+    if n_tiles > MAX_INGEST_TILES:
+        raise ValueError(f"AOI spans {n_tiles} tiles (max {MAX_INGEST_TILES} per ingest); "
+                         f"split it into smaller AOIs")
+    missing = [(tx, ty)
+               for ty in range(y0 // TILE_PX, (y1 - 1) // TILE_PX + 1)
+               for tx in range(x0 // TILE_PX, (x1 - 1) // TILE_PX + 1)
+               if not os.path.exists(tile_path(epoch, tx, ty))]
+    for tx, ty in missing:
+        ingest_tile(epoch, tx, ty)
+    return len(missing)
@@ -0,0 +1,153 @@
+"""
+Negotiated response encoding
+Every jsonify() response goes through FastJSONProvider, which picks the body
+format from the request:
+  - Accept: application/msgpack          -> MessagePack (falls back to JSON if msgpack is missing)
+  - Prefer: return=minimal or ?slim=1    -> slim profile without redundant fields
+  - X-Response-Layout: columnar or ?layout=columnar -> lists of records as {column: [values]}
+JSON is encoded with orjson when installed. Large bodies are compressed with
+brotli or gzip according to Accept-Encoding.
+"""
+
+import gzip
+import os
+
+from flask import current_app, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack')
+COMPRESSIBLE_TYPES = ('application/json', 'application/msgpack', 'application/x-ndjson', 'text/')
+
+
+def wants_msgpack():
+    accept = request.headers.get('Accept', '')
+    return msgpack is not None and any(t in accept for t in MSGPACK_TYPES)
+
+
+def wants_slim():
+    return ('return=minimal' in request.headers.get('Prefer', '')
+            or request.args.get('slim', '').lower() in ('1', 'true'))
+
+
+def wants_columnar():
+    return (request.headers.get('X-Response-Layout', '').lower() == 'columnar'
+            or request.args.get('layout', '').lower() == 'columnar')
+
+
+def slim(payload):
+    """Drop fields that repeat information available elsewhere in the response"""
+    if isinstance(payload, list):
+        return [slim(v) for v in payload]
+    if not isinstance(payload, dict):
+        return payload
+
+    out = {k: slim(v) for k, v in payload.items()}
+    # map_id duplicates the mapid/token already embedded in url_template
+    if 'url_template' in out:
+        out.pop('map_id', None)
+    # dataset duplicated next to image.dataset
+    if ('dataset' in out and isinstance(out.get('image'), dict)
+            and out['dataset'] == out['image'].get('dataset')):
+        out.pop('dataset', None)
+    # process-claim: 'claim' carries every hazard field, and a single ranked hazard repeats it
+    if isinstance(out.get('claim'), dict) and isinstance(out.get('hazard'), dict):
+        if all(out['claim'].get(k) == v for k, v in out['hazard'].items()):
+            out.pop('hazard')
+    if isinstance(out.get('ranked_hazards'), list) and len(out['ranked_hazards']) == 1:
+        out.pop('ranked_hazards')
+    return out
+
+
+def columnar(payload):
+    """Turn top-level lists of uniform records into {column: [values]}"""
+    if not isinstance(payload, dict):
+        return payload
+    out = {}
+    for key, value in payload.items():
+        if (isinstance(value, list) and value and all(isinstance(r, dict) for r in value)):
+            columns = []
+            for record in value:
+                for col in record:
+                    if col not in columns:
+                        columns.append(col)
+            out[key] = {col: [r.get(col) for r in value] for col in columns}
+        else:
+            out[key] = value
+    return out
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """orjson-backed JSON provider that negotiates the response format"""
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            try:
+                return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if has_request_context():
+            if wants_slim():
+                obj = slim(obj)
+            if wants_columnar():
+                obj = columnar(obj)
+            if wants_msgpack():
+                return current_app.response_class(
+                    msgpack.packb(obj, default=str, use_bin_type=True),
+                    mimetype='application/msgpack')
+        if orjson is not None:
+            try:
+                body = orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+                return current_app.response_class(body, mimetype=self.mimetype)
+            except TypeError:
+                pass
+        return super().response(obj)
+
+
+def _compress(response):
+    if response.direct_passthrough or response.is_streamed:
+        return response
+    if response.headers.get('Content-Encoding') or response.status_code < 200:
+        return response
+    if not response.mimetype or not response.mimetype.startswith(COMPRESSIBLE_TYPES):
+        return response
+    response.vary.update(['Accept', 'Accept-Encoding', 'Prefer'])
+
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+
+    # Highest-q acceptable coding (q=0 excludes it); brotli wins ties
+    coding = request.accept_encodings.best_match(['br', 'gzip'] if brotli is not None else ['gzip'])
+    if coding == 'br':
+        response.set_data(brotli.compress(body, quality=4))
+        response.headers['Content-Encoding'] = 'br'
+    elif coding == 'gzip':
+        response.set_data(gzip.compress(body, compresslevel=5))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def init_app(app):
+    """Install the negotiating JSON provider and response compression"""
+    app.json = FastJSONProvider(app)
+    app.after_request(_compress)
@@ -0,0 +1,210 @@
+"""
+Composite building shared by the imagery, thumbnail and claim endpoints, and
+the daily IMERG precipitation series used by time series and parametric triggers
+"""
+
+import ee
+
+
+def aoi_to_geometry(aoi):
+    """Convert AOI to Earth Engine Geometry"""
+    if isinstance(aoi, list) and len(aoi) == 4:
+        # Bounding box [minLon, minLat, maxLon, maxLat]
+        return ee.Geometry.Rectangle(aoi)
+    elif isinstance(aoi, dict) and 'type' in aoi:
+        # GeoJSON geometry
+        return ee.Geometry(aoi)
+    else:
+        raise ValueError(f"Unsupported AOI type: {type(aoi)}")
+
+
+def mask_s2(img):
+    """Mask clouds/shadows/snow using the Sentinel-2 SCL band and scale to reflectance"""
+    scl = img.select('SCL')
+    mask = (scl.neq(3).And(scl.neq(7)).And(scl.neq(8))
+           .And(scl.neq(9)).And(scl.neq(10)).And(scl.neq(11)))
+    scaled = img.divide(10000)
+    return scaled.updateMask(mask)
+
+
+def mask_landsat(img):
+    """Mask clouds/shadows using the Landsat QA_PIXEL band and scale to reflectance"""
+    qa = img.select('QA_PIXEL')
+    mask = (qa.bitwiseAnd(1 << 1).neq(0)
+           .Or(qa.bitwiseAnd(1 << 2).neq(0))
+           .Or(qa.bitwiseAnd(1 << 3).neq(0))
+           .Or(qa.bitwiseAnd(1 << 4).neq(0))
+           .Or(qa.bitwiseAnd(1 << 5).neq(0))).Not()
+    sr_bands = ['SR_B1', 'SR_B2', 'SR_B3', 'SR_B4', 'SR_B5', 'SR_B6', 'SR_B7']
+    sr = img.select(sr_bands).divide(10000)
+    return sr.updateMask(mask)
+
+
+def scale_modis(img):
+    """Scale MODIS surface reflectance bands"""
+    sr_bands = ['sur_refl_b01', 'sur_refl_b02', 'sur_refl_b03', 'sur_refl_b04']
+    sr = img.select(sr_bands).multiply(0.0001)
+    return sr
+
+
+# Dataset, per-scene preprocessing and default visualization per satellite
+SATELLITES = {
+    'sentinel2': {
+        'dataset': 'COPERNICUS/S2_SR_HARMONIZED',
+        'prepare': mask_s2,
+        'cloud_property': 'CLOUDY_PIXEL_PERCENTAGE',
+        'rank_property': 'CLOUDY_PIXEL_PERCENTAGE',
+        'bands': ['B4', 'B3', 'B2']
+    },
+    'landsat8': {
+        'dataset': 'LANDSAT/LC08/C02/T1_L2',
+        'prepare': mask_landsat,
+        'cloud_property': None,
+        'rank_property': 'CLOUD_COVER',
+        'bands': ['SR_B4', 'SR_B3', 'SR_B2']
+    },
+    'landsat9': {
+        'dataset': 'LANDSAT/LC09/C02/T1_L2',
+        'prepare': mask_landsat,
+        'cloud_property': None,
+        'rank_property': 'CLOUD_COVER',
+        'bands': ['SR_B4', 'SR_B3', 'SR_B2']
+    },
+    'modis': {
+        'dataset': 'MODIS/061/MOD09GA',
+        'prepare': scale_modis,
+        'cloud_property': None,
+        'rank_property': None,
+        'bands': ['sur_refl_b01', 'sur_refl_b04', 'sur_refl_b03']
+    }
+}
+
+
+# Scenes covering at least this fraction of the AOI count as full coverage
+FULL_COVERAGE = 0.99
+REDUCERS = ('median', 'mosaic', 'quality')
+
+
+def rank_scenes(collection, geom, rank_property, max_scenes=None):
+    """
+    Rank raw scenes by cloud cover and AOI footprint coverage, best first.
+    Scenes that fully cover the AOI always outrank partial ones; within each
+    group clearer and better-covering scenes come first. Sets 'aoi_coverage'
+    and 'quality_rank' (lower is better) on every scene.
+    """
+    aoi_area = geom.area(1)
+
+    def score(img):
+        coverage = img.geometry().intersection(geom, 1).area(1).divide(aoi_area)
+        cloud = ee.Number(img.get(rank_property)) if rank_property else ee.Number(0)
+        partial_penalty = ee.Number(ee.Algorithms.If(coverage.gte(FULL_COVERAGE), 0, 1000))
+        rank = partial_penalty.add(cloud).subtract(coverage.multiply(100))
+        return img.set({'aoi_coverage': coverage, 'quality_rank': rank})
+
+    ranked = collection.map(score).sort('quality_rank')
+    if max_scenes:
+        ranked = ranked.limit(int(max_scenes), 'quality_rank')
+    return ranked
+
+
+def _keep_rank(prepare):
+    # Image math drops properties, so carry the ranking through the preprocessing
+    def fn(img):
+        return prepare(img).copyProperties(img, ['quality_rank', 'aoi_coverage',
+                                                 'system:time_start'])
+    return fn
+
+
+def _with_quality_band(prepare):
+    # Per-pixel copy of the scene rank (negated, higher is better) for qualityMosaic
+    def fn(img):
+        out = prepare(img)
+        quality = (ee.Image.constant(ee.Number(img.get('quality_rank')).multiply(-1))
+                   .toFloat()
+                   .rename('quality')
+                   .updateMask(out.select(0).mask()))
+        return out.addBands(quality)
+    return fn
+
+
+def build_composite(aoi, start_date, end_date, satellite='sentinel2', max_cloud=30,
+                    reducer='median', max_scenes=None):
+    """
+    Build a clipped composite for the AOI and date range.
+    With `max_scenes` (or the 'quality' reducer) scenes are ranked first and only
+    the best are masked and composited. 'quality' is a qualityMosaic that takes
+    each pixel from the best-ranked scene where it is clear.
+    Returns (image, dataset, vis_params); raises ValueError on bad input.
+    """
+    geom = aoi_to_geometry(aoi)
+    sat = satellite.lower()
+    if sat not in SATELLITES:
+        raise ValueError(f"Unsupported satellite: {satellite}")
+    if reducer not in REDUCERS:
+        raise ValueError(f"Unsupported reducer: {reducer}")
+    spec = SATELLITES[sat]
+
+    collection = (ee.ImageCollection(spec['dataset'])
+                 .filterBounds(geom)
+                 .filterDate(start_date, end_date))
+    if spec['cloud_property']:
+        collection = collection.filter(ee.Filter.lt(spec['cloud_property'], max_cloud))
+
+    # Rank and trim before the per-pixel masking so only kept scenes pay for it
+    ranked = bool(max_scenes) or reducer == 'quality'
+    if ranked:
+        collection = rank_scenes(collection, geom, spec['rank_property'], max_scenes)
+
+    if reducer == 'quality':
+        collection = collection.map(_with_quality_band(spec['prepare']))
+    elif ranked:
+        collection = collection.map(_keep_rank(spec['prepare']))
+    else:
+        collection = collection.map(spec['prepare'])
+
+    # Reduce collection
+    if reducer == 'median':
+        image = collection.median().clip(geom)
+    elif reducer == 'mosaic':
+        # mosaic() paints the last image on top, so put the best scene last
+        if ranked:
+            collection = collection.sort('quality_rank', False)
+        image = collection.mosaic().clip(geom)
+    else:
+        image = collection.qualityMosaic('quality').clip(geom)
+        image = image.select(image.bandNames().remove('quality'))
+
+    vis_params = {
+        'bands': spec['bands'],
+        'min': 0.02,
+        'max': 0.3
+    }
+    return image, spec['dataset'], vis_params
+
+
+IMERG_DATASET = 'NASA/GPM_L3/IMERG_V07'
+
+
+def daily_imerg(start_date, end_date):
+    """
+    Daily precipitation totals (mm, band 'precipitation') for every day in
+    [start_date, end_date) that has IMERG granules. The Final run lags by
+    months, so recent days are simply missing rather than zero.
+    """
+    coll = ee.ImageCollection(IMERG_DATASET).select('precipitation')
+    start = ee.Date(start_date)
+    n_days = ee.Date(end_date).difference(start, 'day').floor()
+
+    def daily(i):
+        day = start.advance(i, 'day')
+        granules = coll.filterDate(day, day.advance(1, 'day'))
+        # Half-hourly mm/hr rates -> daily total in mm. An empty sum has no
+        # bands, so empty days get a placeholder and are filtered out below
+        total = ee.Image(ee.Algorithms.If(
+            granules.size().gt(0),
+            granules.sum().multiply(0.5),
+            ee.Image.constant(0).rename('precipitation')))
+        return total.set({'system:time_start': day.millis(), 'granules': granules.size()})
+
+    return (ee.ImageCollection(ee.List.sequence(0, n_days.subtract(1)).map(daily))
+            .filter(ee.Filter.gt('granules', 0)))
@@ -0,0 +1,166 @@
+"""
+Vectorized parametric rainfall trigger evaluation
+Pulls one daily IMERG precipitation grid covering every policy, then evaluates
+rolling-window rainfall totals and payout tiers for all policies with NumPy.
+"""
+
+import math
+from datetime import date
+
+import ee
+import numpy as np
+
+from imagery import daily_imerg
+from tiling import aoi_bounds
+
+# IMERG native grid spacing in degrees
+GRID_RES = 0.1
+# Same event window the /validate meteorology check uses
+DEFAULT_WINDOW_DAYS = 3
+RAINFALL_TRIGGER_TYPES = ('rainfall', 'precipitation')
+NO_DATA_BAND = 'no_data'
+
+
+def policy_point(policy):
+    """(lon, lat) used for the policy's grid cell lookup: location or AOI centre"""
+    if 'location' in policy:
+        return float(policy['location']['lon']), float(policy['location']['lat'])
+    min_lon, min_lat, max_lon, max_lat = aoi_bounds(policy['aoi'])
+    return (min_lon + max_lon) / 2.0, (min_lat + max_lat) / 2.0
+
+
+def grid_for_points(lons, lats, res=GRID_RES):
+    """Snap the points' bounding box to the grid; returns (min_lon, max_lat, width, height)"""
+    min_lon = math.floor(min(lons) / res) * res
+    max_lat = math.ceil(max(lats) / res) * res
+    width = max(1, int(math.floor((max(lons) - min_lon) / res)) + 1)
+    height = max(1, int(math.floor((max_lat - min(lats)) / res)) + 1)
+    return min_lon, max_lat, width, height
+
+
+def fetch_precipitation_grid(start_date, end_date, min_lon, max_lat, width, height,
+                             res=GRID_RES):
+    """
+    Daily precipitation totals (mm) as a (days, height, width) float32 array
+    covering every calendar day in [start_date, end_date); days IMERG has no
+    data for yet are NaN planes.
+    """
+    daily = daily_imerg(start_date, end_date).map(
+        lambda img: img.unmask(0).toFloat().rename(
+            ee.String('d').cat(img.date().format('YYYYMMdd'))))
+    # No granules at all (e.g. the whole window is past the Final-run lag):
+    # toBands() would have no bands, so fetch a sentinel band instead
+    stack = ee.Image(ee.Algorithms.If(
+        daily.size().gt(0),
+        daily.toBands(),
+        ee.Image.constant(0).rename(NO_DATA_BAND)))
+    pixels = ee.data.computePixels({
+        'expression': stack,
+        'fileFormat': 'NUMPY_NDARRAY',
+        'grid': {
+            'dimensions': {'width': width, 'height': height},
+            'affineTransform': {
+                'scaleX': res,
+                'shearX': 0,
+                'translateX': min_lon,
+                'shearY': 0,
+                'scaleY': -res,
+                'translateY': max_lat
+            },
+            'crsCode': 'EPSG:4326'
+        }
+    })
+
+    # Structured (height, width) array with one field per available day, named
+    # '<index>_dYYYYMMDD' by toBands(); place each on the calendar
+    first = date.fromisoformat(start_date[:10])
+    n_calendar = (date.fromisoformat(end_date[:10]) - first).days
+    grid = np.full((max(n_calendar, 0), height, width), np.nan, dtype=np.float32)
+    for name in pixels.dtype.names or ():
+        if name == NO_DATA_BAND:
+            continue
+        stamp = name.rsplit('_d', 1)[-1]
+        day = date(int(stamp[:4]), int(stamp[4:6]), int(stamp[6:8]))
+        grid[(day - first).days] = pixels[name]
+    return grid
+
+
+def max_window_sums(grid, window):
+    """
+    Max rolling `window`-day total per cell, shape (height, width). Only windows
+    with data for every day count; cells with no such window are NaN.
+    """
+    days = grid.shape[0]
+    window = max(1, int(window))
+    if window > days:
+        return np.full(grid.shape[1:], np.nan)
+    missing = np.isnan(grid)
+    zeros = np.zeros((1,) + grid.shape[1:], dtype=np.float64)
+    csum = np.concatenate([zeros, np.cumsum(np.where(missing, 0.0, grid), axis=0,
+                                            dtype=np.float64)])
+    cmissing = np.concatenate([zeros, np.cumsum(missing, axis=0, dtype=np.float64)])
+    sums = csum[window:] - csum[:-window]
+    complete = (cmissing[window:] - cmissing[:-window]) == 0
+    sums = np.where(complete, sums, -np.inf).max(axis=0)
+    return np.where(np.isfinite(sums), sums, np.nan)
+
+
+def evaluate_policies(policies, grid, min_lon, max_lat, res=GRID_RES):
+    """
+    Evaluate every policy's rainfall triggers against the grid.
+    Policies are grouped by window length so each distinct window is one
+    vectorized pass; tiers are picked with a padded threshold matrix.
+    """
+    n = len(policies)
+    points = np.array([policy_point(p) for p in policies], dtype=np.float64).reshape(n, 2)
+    cols = np.clip(np.floor((points[:, 0] - min_lon) / res).astype(int), 0, grid.shape[2] - 1)
+    rows = np.clip(np.floor((max_lat - points[:, 1]) / res).astype(int), 0, grid.shape[1] - 1)
+    windows = np.array([int(p.get('window_days', DEFAULT_WINDOW_DAYS)) for p in policies])
+    # Days with data for the whole grid (missing days are NaN planes)
+    days_evaluated = int((~np.isnan(grid).all(axis=(1, 2))).sum())
+
+    rainfall = np.zeros(n, dtype=np.float64)
+    for window in np.unique(windows):
+        idx = np.nonzero(windows == window)[0]
+        rainfall[idx] = max_window_sums(grid, window)[rows[idx], cols[idx]]
+
+    # Rainfall triggers per policy, sorted by threshold, padded with +inf
+    triggers = [sorted((t for t in p.get('triggers', [])
+                        if t.get('type', 'rainfall') in RAINFALL_TRIGGER_TYPES),
+                       key=lambda t: float(t['threshold']))
+                for p in policies]
+    k = max([len(t) for t in triggers] + [1])
+    thresholds = np.full((n, k), np.inf)
+    for i, policy_triggers in enumerate(triggers):
+        thresholds[i, :len(policy_triggers)] = [float(t['threshold']) for t in policy_triggers]
+    # Windows longer than the run of available days can't be evaluated
+    insufficient = np.isnan(rainfall)
+    tiers = (np.where(insufficient, -np.inf, rainfall)[:, None] >= thresholds).sum(axis=1) - 1
+
+    results = []
+    for i, policy in enumerate(policies):
+        tier = int(tiers[i])
+        trigger = triggers[i][tier] if tier >= 0 else None
+        results.append({
+            'id': policy.get('id'),
+            'triggered': trigger is not None,
+            'rainfall_mm': None if insufficient[i] else round(float(rainfall[i]), 2),
+            'window_days': int(windows[i]),
+            'days_evaluated': days_evaluated,
+            'insufficient_data': bool(insufficient[i]),
+            'tier': tier if trigger else None,
+            'payout': trigger.get('payout', 0) if trigger else 0,
+            'description': trigger.get('description') if trigger else None
+        })
+    return results
+
+
+def evaluate_batch(policies, start_date, end_date):
+    """Fetch one precipitation grid for all policies and evaluate their triggers"""
+    if not policies:
+        return []
+    points = [policy_point(p) for p in policies]
+    min_lon, max_lat, width, height = grid_for_points(
+        [p[0] for p in points], [p[1] for p in points])
+    grid = fetch_precipitation_grid(start_date, end_date, min_lon, max_lat, width, height)
+    return evaluate_policies(policies, grid, min_lon, max_lat)
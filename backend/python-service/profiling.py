@@ -0,0 +1,199 @@
+"""
+On-demand request profiling
+A per-request stack sampler that can be switched on with the `X-Profile: 1`
+header, a `?profile=1` query flag, or a sampling rate across traffic. Samples
+cover the Flask handler, helpers and time blocked in the Earth Engine client,
+including work handed to thread pools through `propagate()`, are tagged with
+each thread's current stage, and are written as collapsed-stack files
+(flamegraph.pl / speedscope input) plus a JSON summary per request.
+"""
+
+import contextvars
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import request
+
+PROFILE_DIR = os.getenv(
+    'PROFILE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'profiles')
+)
+SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+INTERVAL = float(os.getenv('PROFILE_INTERVAL_MS', 5)) / 1000.0
+
+# Frames from these packages count as time spent in the Earth Engine client
+EE_CLIENT_MARKERS = (os.sep + 'ee' + os.sep, 'googleapiclient', 'google' + os.sep + 'auth',
+                     'httplib2', 'urllib3')
+
+# Active sampler for the current request, carried into pool tasks by propagate()
+_current = contextvars.ContextVar('profile_sampler', default=None)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame):
+    labels = []
+    in_ee = False
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        if any(m in frame.f_code.co_filename for m in EE_CLIENT_MARKERS):
+            in_ee = True
+        frame = frame.f_back
+    return ';'.join(reversed(labels)), in_ee
+
+
+class Sampler(threading.Thread):
+    """Samples the request's threads every INTERVAL seconds, tagged by each thread's stage"""
+
+    def __init__(self, thread_id, interval=INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        # thread id -> current stage of every thread working for the request
+        self.threads = {thread_id: 'request'}
+        self.lock = threading.Lock()
+        self.samples = Counter()
+        self.ee_samples = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frames = sys._current_frames()
+            with self.lock:
+                threads = list(self.threads.items())
+            for thread_id, stage in threads:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack, in_ee = _collapse(frame)
+                self.samples[(stage, stack)] += 1
+                if in_ee:
+                    self.ee_samples[stage] += 1
+
+    def attach(self, thread_id, stage):
+        with self.lock:
+            self.threads[thread_id] = stage
+
+    def detach(self, thread_id):
+        with self.lock:
+            self.threads.pop(thread_id, None)
+
+    def stage_of(self, thread_id):
+        with self.lock:
+            return self.threads.get(thread_id, 'request')
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def set_stage(name):
+    """Tag subsequent samples of the current thread with `name` (no-op when not profiling)"""
+    sampler = _current.get()
+    if sampler is not None:
+        sampler.attach(threading.get_ident(), name)
+
+
+def propagate(fn):
+    """
+    Wrap `fn` for a thread pool so it is sampled under the caller's profile,
+    starting in the caller's stage (returns `fn` unchanged when not profiling)
+    """
+    sampler = _current.get()
+    if sampler is None:
+        return fn
+    stage = sampler.stage_of(threading.get_ident())
+
+    def run(*args, **kwargs):
+        thread_id = threading.get_ident()
+        token = _current.set(sampler)
+        sampler.attach(thread_id, stage)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            sampler.detach(thread_id)
+            _current.reset(token)
+    return run
+
+
+def _should_profile():
+    if request.headers.get('X-Profile', '').lower() in ('1', 'true'):
+        return True
+    if request.args.get('profile', '').lower() in ('1', 'true'):
+        return True
+    return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+
+def _write(profile_id, endpoint, sampler, duration):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    by_stage = {}
+    for (stage, stack), count in sampler.samples.items():
+        by_stage.setdefault(stage, []).append((stack, count))
+
+    for stage, stacks in by_stage.items():
+        path = os.path.join(PROFILE_DIR, f"{profile_id}.{stage}.collapsed")
+        with open(path, 'w') as f:
+            for stack, count in sorted(stacks):
+                f.write(f"{stack} {count}\n")
+
+    summary = {
+        'profile_id': profile_id,
+        'endpoint': endpoint,
+        'duration_s': round(duration, 3),
+        'interval_ms': sampler.interval * 1000,
+        'stages': {
+            stage: {
+                'samples': sum(c for _, c in stacks),
+                'ee_client_samples': sampler.ee_samples.get(stage, 0)
+            }
+            for stage, stacks in by_stage.items()
+        }
+    }
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.json"), 'w') as f:
+        json.dump(summary, f, indent=2)
+
+
+def init_app(app):
+    """Register the before/after request hooks that start and dump the sampler"""
+
+    @app.before_request
+    def _start_profile():
+        _current.set(None)
+        if not _should_profile():
+            return
+        sampler = Sampler(threading.get_ident())
+        sampler.started_at = time.perf_counter()
+        request_id = ''.join(c for c in request.headers.get('X-Request-ID', '')
+                             if c.isalnum() or c in '-_')[:64]
+        sampler.profile_id = request_id or uuid.uuid4().hex[:16]
+        _current.set(sampler)
+        sampler.start()
+
+    @app.after_request
+    def _tag_response(response):
+        sampler = _current.get()
+        if sampler is not None:
+            response.headers['X-Profile-Id'] = sampler.profile_id
+        return response
+
+    @app.teardown_request
+    def _stop_profile(exc):
+        sampler = _current.get()
+        if sampler is None:
+            return
+        _current.set(None)
+        sampler.stop()
+        duration = time.perf_counter() - sampler.started_at
+        try:
+            _write(sampler.profile_id, request.path, sampler, duration)
+            print(f"🔥 Profile {sampler.profile_id} written for {request.path} ({duration:.2f}s)")
+        except Exception as e:
+            print(f"⚠️  Failed to write profile {sampler.profile_id}: {e}")
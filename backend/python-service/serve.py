@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Production entry point for the Earth Engine Python Service
+Runs N gunicorn worker processes; workers share map IDs, validation results
+and static-layer lookups through the on-disk shared cache (shared_cache.py).
+"""
+
+import multiprocessing
+import os
+
+import shared_cache
+
+
+def worker_count():
+    return int(os.getenv('PYTHON_SERVICE_WORKERS', multiprocessing.cpu_count()))
+
+
+def main():
+    port = int(os.getenv('PYTHON_SERVICE_PORT', 5001))
+    workers = worker_count()
+    threads = int(os.getenv('PYTHON_SERVICE_THREADS', 4))
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        # gunicorn is POSIX-only; fall back to the single-process dev server
+        print("⚠️  gunicorn not available - falling back to single-process server")
+        from earth_engine_service import app
+        app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
+        return
+
+    class ServiceApplication(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            # Imported in each worker so Earth Engine is initialized after fork
+            from earth_engine_service import app
+            return app
+
+    def on_starting(server):
+        try:
+            removed = shared_cache.purge_expired()
+            print(f"🧹 Purged {removed} expired shared cache entries")
+        except Exception as e:
+            print(f"⚠️  Shared cache purge skipped: {e}")
+
+    print(f"🚀 Earth Engine Python Service starting on port {port} "
+          f"({workers} workers x {threads} threads)")
+    ServiceApplication({
+        'bind': f"0.0.0.0:{port}",
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread',
+        'timeout': int(os.getenv('PYTHON_SERVICE_TIMEOUT', 300)),
+        'preload_app': False,
+        'on_starting': on_starting
+    }).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Cross-process shared cache
+Local on-disk key-value store (SQLite in WAL mode) so every worker process on
+the box sees map IDs, validation results and static-layer lookups computed by
+any other worker.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+CACHE_PATH = os.getenv(
+    'SHARED_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'shared_cache.db')
+)
+ENABLED = os.getenv('SHARED_CACHE_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+
+# Default TTLs (seconds) per namespace
+MAP_ID_TTL = int(os.getenv('MAP_ID_TTL', 3600))
+VALIDATION_TTL = int(os.getenv('VALIDATION_TTL', 6 * 3600))
+STATIC_LAYER_TTL = int(os.getenv('STATIC_LAYER_TTL', 30 * 24 * 3600))
+# Writes delete expired rows at most this often (seconds) per process
+PURGE_INTERVAL = int(os.getenv('SHARED_CACHE_PURGE_INTERVAL', 600))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    namespace  TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    value      TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS idx_cache_expires ON cache (expires_at);
+"""
+
+_initialized_pid = None
+_last_purge = 0.0
+
+
+def _connect():
+    global _initialized_pid
+    os.makedirs(os.path.dirname(CACHE_PATH) or '.', exist_ok=True)
+    conn = sqlite3.connect(CACHE_PATH, timeout=10)
+    if _initialized_pid != os.getpid():
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        _initialized_pid = os.getpid()
+    return conn
+
+
+def make_key(*parts):
+    """Stable hash of JSON-serializable key parts"""
+    canonical = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def get_entry(namespace, key):
+    """Return (value, expires_at), or None if missing/expired/disabled/unavailable"""
+    if not ENABLED:
+        return None
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                'SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?',
+                (namespace, key)
+            ).fetchone()
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️  Shared cache read failed: {e}")
+        return None
+    if row is None or row[1] < time.time():
+        return None
+    return json.loads(row[0]), row[1]
+
+
+def get(namespace, key):
+    """Return the cached value, or None if missing/expired/disabled/unavailable"""
+    entry = get_entry(namespace, key)
+    return entry[0] if entry is not None else None
+
+
+def set(namespace, key, value, ttl):
+    """
+    Store a JSON-serializable value for `ttl` seconds (best effort: failures are
+    logged). Expired rows are purged opportunistically every PURGE_INTERVAL.
+    """
+    global _last_purge
+    if not ENABLED:
+        return
+    try:
+        conn = _connect()
+        try:
+            now = time.time()
+            conn.execute(
+                'INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)',
+                (namespace, key, json.dumps(value, default=str), now + ttl)
+            )
+            if now - _last_purge >= PURGE_INTERVAL:
+                _last_purge = now
+                conn.execute('DELETE FROM cache WHERE expires_at < ?', (now,))
+            conn.commit()
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️  Shared cache write failed: {e}")
+
+
+def purge_expired():
+    """Delete expired entries; returns the number removed"""
+    conn = _connect()
+    try:
+        cur = conn.execute('DELETE FROM cache WHERE expires_at < ?', (time.time(),))
+        conn.commit()
+        return cur.rowcount
+    finally:
+        conn.close()
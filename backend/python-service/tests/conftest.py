@@ -0,0 +1,12 @@
+import os
+import sys
+from unittest import mock
+
+# Service modules are imported flat, as the service and the Vercel handler do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The tested cores are pure Python/NumPy; Earth Engine is only touched at call time
+try:
+    import ee  # noqa: F401
+except ImportError:
+    sys.modules['ee'] = mock.MagicMock()
@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+import pytest
+
+import embedding_index as ei
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setattr(ei, 'INDEX_DIR', str(tmp_path))
+    ei._tile_cache.clear()
+    ei._change_cache.clear()
+    yield tmp_path
+    ei._tile_cache.clear()
+    ei._change_cache.clear()
+
+
+def write_tile(epoch, tx, ty, data):
+    path = ei.tile_path(epoch, tx, ty)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.save(path, data.astype(np.float16))
+
+
+def pixel_box(x0, y0, x1, y1):
+    """AOI bbox through the centres of global pixels [x0, x1) x [y0, y1)"""
+    return [-180.0 + (x0 + 0.5) * ei.RES_DEG, 90.0 - (y1 - 0.5) * ei.RES_DEG,
+            -180.0 + (x1 - 0.5) * ei.RES_DEG, 90.0 - (y0 + 0.5) * ei.RES_DEG]
+
+
+def test_cosine_change_identical_orthogonal_and_empty():
+    a = np.array([[1.0, 0.0], [1.0, 0.0], [0.0, 0.0]])
+    b = np.array([[2.0, 0.0], [0.0, 3.0], [1.0, 0.0]])
+    change = ei.cosine_change(a, b)
+    assert change[0] == pytest.approx(0.0)
+    assert change[1] == pytest.approx(1.0)
+    assert np.isnan(change[2])
+
+
+def test_top_changed_ranks_parcels_across_tiles(index):
+    shape = (ei.TILE_PX, ei.TILE_PX, ei.DIM)
+    base = np.zeros(shape)
+    base[..., 0] = 1.0
+    changed = base.copy()
+    # Rows 0-127 of tile (0, 0) turn orthogonal (change 1); everything else is unchanged
+    changed[:128, :, 0] = 0.0
+    changed[:128, :, 1] = 1.0
+    for tx in (0, 1):
+        write_tile(2022, tx, 0, base)
+        write_tile(2023, tx, 0, changed if tx == 0 else base)
+
+    parcels = [
+        {'id': 'unchanged', 'aoi': pixel_box(10, 200, 20, 210)},
+        {'id': 'changed', 'aoi': pixel_box(10, 10, 20, 20)},
+        # Half in each tile: 200 changed pixels (tile 0) and 200 unchanged (tile 1)
+        {'id': 'straddling', 'aoi': pixel_box(246, 100, 266, 120)},
+        {'id': 'no_data', 'aoi': pixel_box(5000, 10, 5010, 20)},
+    ]
+    result = ei.top_changed(parcels, 2022, 2023, k=4)
+
+    assert [r['id'] for r in result] == ['changed', 'straddling', 'unchanged', 'no_data']
+    assert result[0]['mean_change'] == pytest.approx(1.0)
+    assert result[0]['valid_pixels'] == 100
+    assert result[1]['mean_change'] == pytest.approx(0.5)
+    assert result[1]['valid_pixels'] == 400
+    assert result[2]['mean_change'] == pytest.approx(0.0)
+    assert result[3] == {'id': 'no_data', 'mean_change': None, 'valid_pixels': 0}
+
+
+def test_top_changed_matches_aoi_change(index):
+    rng = np.random.default_rng(0)
+    pre = rng.random((ei.TILE_PX, ei.TILE_PX, ei.DIM))
+    write_tile(2022, 0, 0, pre)
+    write_tile(2023, 0, 0, pre + rng.random(pre.shape))
+    aoi = pixel_box(30, 40, 70, 90)
+
+    [top] = ei.top_changed([{'id': 'p', 'aoi': aoi}], 2022, 2023, k=1)
+    expected = ei.aoi_change(aoi, 2022, 2023)
+    assert top['mean_change'] == pytest.approx(expected['mean_change'], rel=1e-5)
+    assert top['valid_pixels'] == expected['valid_pixels']
+
+
+def test_top_changed_rejects_queries_over_the_tile_budget(index, monkeypatch):
+    monkeypatch.setattr(ei, 'MAX_QUERY_TILES', 2)
+    with pytest.raises(ValueError):
+        ei.top_changed([{'id': 'big', 'aoi': pixel_box(0, 0, 3 * ei.TILE_PX, 10)}], 2022, 2023)
+
+
+def test_ingest_aoi_rejects_oversized_aois(index, monkeypatch):
+    monkeypatch.setattr(ei, 'MAX_INGEST_TILES', 4)
+    with pytest.raises(ValueError):
+        ei.ingest_aoi(pixel_box(0, 0, 5 * ei.TILE_PX, 10), 2022)
@@ -0,0 +1,81 @@
+import gzip
+
+from flask import Flask, jsonify
+
+import encoding
+from encoding import columnar, slim
+
+
+def make_app(payload):
+    app = Flask(__name__)
+    encoding.init_app(app)
+
+    @app.route('/')
+    def index():
+        return jsonify(payload)
+
+    return app
+
+
+def test_slim_drops_map_id_next_to_url_template():
+    out = slim({'url_template': 'https://tiles/{z}/{x}/{y}', 'map_id': {'mapid': 'abc'}})
+    assert out == {'url_template': 'https://tiles/{z}/{x}/{y}'}
+
+
+def test_slim_drops_dataset_repeated_in_image():
+    out = slim({'image': {'dataset': 'S2'}, 'dataset': 'S2'})
+    assert out == {'image': {'dataset': 'S2'}}
+
+
+def test_slim_keeps_dataset_that_differs_from_image():
+    payload = {'image': {'dataset': 'S2'}, 'dataset': 'L8'}
+    assert slim(payload) == payload
+
+
+def test_slim_without_dataset_fields():
+    payload = {'image': {'bands': []}}
+    assert slim(payload) == payload
+
+
+def test_slim_drops_hazard_covered_by_claim_and_single_ranked_hazard():
+    out = slim({
+        'claim': {'hazard': 'flood', 'damage_pct': 10.0, 'claim_status': 'Reject'},
+        'hazard': {'hazard': 'flood', 'damage_pct': 10.0},
+        'ranked_hazards': [{'hazard': 'flood'}]
+    })
+    assert set(out) == {'claim'}
+
+
+def test_slim_recurses_into_lists():
+    out = slim({'items': [{'url_template': 'u', 'map_id': 'm'}]})
+    assert out == {'items': [{'url_template': 'u'}]}
+
+
+def test_columnar_turns_record_lists_into_columns():
+    out = columnar({'success': True, 'claims': [{'a': 1, 'b': 2}, {'a': 3, 'c': 4}]})
+    assert out == {'success': True, 'claims': {'a': [1, 3], 'b': [2, None], 'c': [None, 4]}}
+
+
+def test_columnar_leaves_other_values_alone():
+    payload = {'empty': [], 'values': [1, 2], 'nested': {'x': [{'a': 1}]}}
+    assert columnar(payload) == payload
+
+
+def test_slim_query_flag_without_dataset():
+    client = make_app({'image': {'bands': []}}).test_client()
+    resp = client.get('/?slim=1')
+    assert resp.status_code == 200
+    assert resp.get_json() == {'image': {'bands': []}}
+
+
+def test_compression_honours_zero_quality():
+    client = make_app({'values': list(range(2000))}).test_client()
+    resp = client.get('/', headers={'Accept-Encoding': 'br;q=0, gzip'})
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert b'1999' in gzip.decompress(resp.get_data())
+
+
+def test_compression_skipped_when_nothing_acceptable():
+    client = make_app({'values': list(range(2000))}).test_client()
+    resp = client.get('/', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in resp.headers
@@ -0,0 +1,93 @@
+from unittest import mock
+
+import numpy as np
+import pytest
+
+import parametric
+from parametric import evaluate_policies, max_window_sums
+
+
+def grid_of(daily_values):
+    """(days, 1, 1) grid from per-day rainfall for a single cell"""
+    return np.array(daily_values, dtype=np.float32).reshape(-1, 1, 1)
+
+
+def policy(policy_id, window_days, thresholds):
+    return {
+        'id': policy_id,
+        'location': {'lon': 0.05, 'lat': 0.05},
+        'window_days': window_days,
+        'triggers': [{'threshold': t, 'payout': t * 10} for t in thresholds]
+    }
+
+
+def test_max_window_sums_picks_the_wettest_window():
+    grid = grid_of([1, 5, 2, 0, 4])
+    assert max_window_sums(grid, 1)[0, 0] == 5
+    assert max_window_sums(grid, 2)[0, 0] == 7
+    assert max_window_sums(grid, 5)[0, 0] == 12
+
+
+def test_max_window_sums_skips_windows_with_missing_days():
+    grid = grid_of([1, 5, np.nan, 4, 4])
+    assert max_window_sums(grid, 2)[0, 0] == 8
+    assert np.isnan(max_window_sums(grid, 3)[0, 0])
+
+
+def test_max_window_sums_window_longer_than_period_is_nan():
+    assert np.isnan(max_window_sums(grid_of([10, 10, 10]), 7)[0, 0])
+
+
+def test_evaluate_policies_picks_highest_tier_reached():
+    grid = grid_of([10, 30, 40, 0])
+    [result] = evaluate_policies([policy('a', 2, [100, 50, 60])], grid, 0.0, 0.1)
+    assert result['rainfall_mm'] == 70
+    assert result['triggered'] is True
+    assert result['tier'] == 1
+    assert result['payout'] == 600
+    assert result['days_evaluated'] == 4
+    assert result['insufficient_data'] is False
+
+
+def test_evaluate_policies_below_threshold_is_not_triggered():
+    [result] = evaluate_policies([policy('a', 1, [50])], grid_of([10, 20]), 0.0, 0.1)
+    assert result['triggered'] is False
+    assert result['tier'] is None
+    assert result['payout'] == 0
+
+
+def test_evaluate_policies_flags_windows_the_data_cannot_cover():
+    grid = grid_of([80, 80, 80, np.nan, np.nan])
+    short, long_ = evaluate_policies(
+        [policy('short', 3, [100]), policy('long', 5, [100])], grid, 0.0, 0.1)
+    assert short['triggered'] is True
+    assert long_['insufficient_data'] is True
+    assert long_['triggered'] is False
+    assert long_['rainfall_mm'] is None
+    assert long_['days_evaluated'] == 3
+
+
+def test_fetch_grid_places_days_on_the_calendar(monkeypatch):
+    pixels = np.zeros((1, 1), dtype=[('0_d20240901', 'f4'), ('1_d20240903', 'f4')])
+    pixels['0_d20240901'] = 4
+    pixels['1_d20240903'] = 6
+    monkeypatch.setattr(parametric, 'ee', mock.MagicMock())
+    monkeypatch.setattr(parametric, 'daily_imerg', mock.MagicMock())
+    parametric.ee.data.computePixels.return_value = pixels
+
+    grid = parametric.fetch_precipitation_grid('2024-09-01', '2024-09-05', 0.0, 0.1, 1, 1)
+    assert grid[:, 0, 0] == pytest.approx([4, np.nan, 6, np.nan], nan_ok=True)
+
+
+def test_fetch_grid_without_any_granules_is_all_missing(monkeypatch):
+    pixels = np.zeros((1, 1), dtype=[(parametric.NO_DATA_BAND, 'f4')])
+    monkeypatch.setattr(parametric, 'ee', mock.MagicMock())
+    monkeypatch.setattr(parametric, 'daily_imerg', mock.MagicMock())
+    parametric.ee.data.computePixels.return_value = pixels
+
+    grid = parametric.fetch_precipitation_grid('2024-09-01', '2024-09-04', 0.0, 0.1, 1, 1)
+    assert grid.shape == (3, 1, 1)
+    assert np.isnan(grid).all()
+    [result] = evaluate_policies([policy('a', 1, [10])], grid, 0.0, 0.1)
+    assert result['insufficient_data'] is True
+    assert result['days_evaluated'] == 0
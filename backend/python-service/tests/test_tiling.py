@@ -0,0 +1,44 @@
+import pytest
+
+from tiling import aoi_bounds, estimate_pixels, merge_partials, split_bounds
+
+
+def test_aoi_bounds_from_bbox_and_geojson():
+    assert aoi_bounds([1, 2, 3, 4]) == [1.0, 2.0, 3.0, 4.0]
+    polygon = {'type': 'Polygon', 'coordinates': [[[0, 0], [2, 0], [2, 1], [0, 1], [0, 0]]]}
+    assert aoi_bounds(polygon) == [0, 0, 2, 1]
+
+
+def test_small_aoi_is_a_single_tile():
+    bounds = [0.0, 0.0, 0.01, 0.01]
+    assert split_bounds(bounds, scale=30, max_pixels=1e7) == [bounds]
+
+
+def test_split_tiles_partition_the_aoi_within_budget():
+    bounds = [-1.0, 0.0, 1.0, 0.5]
+    tiles = split_bounds(bounds, scale=30, max_pixels=1e6)
+    assert len(tiles) > 1
+    for tile in tiles:
+        assert estimate_pixels(tile, 30) <= 1e6 * 0.5 * 1.01
+    # Tiles cover the bbox exactly: same extent and areas add up
+    assert min(t[0] for t in tiles) == bounds[0]
+    assert max(t[2] for t in tiles) == bounds[2]
+    area = sum((t[2] - t[0]) * (t[3] - t[1]) for t in tiles)
+    assert area == pytest.approx((bounds[2] - bounds[0]) * (bounds[3] - bounds[1]))
+
+
+def test_merge_partials_divides_by_total_weight():
+    partials = [
+        {'VV': 3.0, 'VV__weight': 1.5},
+        {'VV': 1.0, 'VV__weight': 0.5},
+    ]
+    assert merge_partials(partials) == {'VV': pytest.approx(2.0)}
+
+
+def test_merge_partials_single_partial_pixel_is_not_deflated():
+    # AOI covering 30% of one pixel of value 0.8: weighted sum 0.24, weight 0.3
+    assert merge_partials([{'b': 0.24, 'b__weight': 0.3}]) == {'b': pytest.approx(0.8)}
+
+
+def test_merge_partials_without_data():
+    assert merge_partials([{'b': None, 'b__weight': 0}, {}]) == {'b': None}
@@ -0,0 +1,193 @@
+"""
+Batch pre/post/difference thumbnail rendering for claim reports
+Renders fixed-size images with the composite vis_params, in parallel, and
+caches them on disk by a hash of everything that determines their content.
+"""
+
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import ee
+import requests
+
+import profiling
+from imagery import aoi_to_geometry, build_composite
+
+CACHE_DIR = os.getenv(
+    'THUMBNAIL_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'thumbnails')
+)
+THUMBNAIL_CONCURRENCY = int(os.getenv('THUMBNAIL_CONCURRENCY', 8))
+# Windows ending within this many days may still receive new scenes, so their
+# thumbnails are only reused for RECENT_THUMBNAIL_TTL seconds
+DATA_LATENCY_DAYS = int(os.getenv('THUMBNAIL_DATA_LATENCY_DAYS', 5))
+RECENT_THUMBNAIL_TTL = int(os.getenv('RECENT_THUMBNAIL_TTL', 3600))
+
+KINDS = ('pre', 'post', 'diff')
+FORMATS = ('png', 'webp')
+
+# Mean absolute reflectance change, black (no change) to red (strong change)
+DIFF_VIS = {
+    'min': 0.0,
+    'max': 0.1,
+    'palette': ['000000', 'ffff00', 'ff0000']
+}
+
+
+def thumbnail_key(spec, kind, size, fmt):
+    """Content hash of a thumbnail: AOI, windows, compositing options, kind and size"""
+    payload = {
+        'aoi': spec['aoi'],
+        'pre': spec['pre'],
+        'post': spec['post'],
+        'satellite': spec.get('satellite', 'sentinel2'),
+        'max_cloud': spec.get('max_cloud', 30),
+        'reducer': spec.get('reducer', 'median'),
+        'max_scenes': spec.get('max_scenes'),
+        'kind': kind,
+        'size': size,
+        'format': fmt
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+# Marks files of windows still receiving scenes; they are re-rendered in place,
+# so clients may only cache them for RECENT_THUMBNAIL_TTL
+RECENT_MARKER = '.recent'
+
+
+def file_name(key, fmt, recent=False):
+    return f"{key}{RECENT_MARKER if recent else ''}.{fmt}"
+
+
+def cache_path(key, fmt, recent=False):
+    return os.path.join(CACHE_DIR, file_name(key, fmt, recent))
+
+
+def cache_max_age(spec):
+    """Seconds a cached thumbnail of this spec stays valid (None = forever)"""
+    latest_end = max(spec['pre']['end'], spec['post']['end'])[:10]
+    cutoff = time.strftime('%Y-%m-%d', time.gmtime(time.time() - DATA_LATENCY_DAYS * 86400))
+    return RECENT_THUMBNAIL_TTL if latest_end >= cutoff else None
+
+
+def client_max_age(filename):
+    """HTTP cache lifetime for a served thumbnail file"""
+    return RECENT_THUMBNAIL_TTL if RECENT_MARKER + '.' in filename else 31536000
+
+
+def is_cached(key, fmt, max_age=None):
+    path = cache_path(key, fmt, recent=max_age is not None)
+    if not os.path.exists(path):
+        return False
+    return max_age is None or time.time() - os.path.getmtime(path) < max_age
+
+
+def _write_cache(key, fmt, data, recent=False):
+    # Unique temp file so concurrent renders of the same key don't clash
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=CACHE_DIR, suffix='.tmp', delete=False) as f:
+        f.write(data)
+    os.replace(f.name, cache_path(key, fmt, recent))
+
+
+def _fetch_png(image, vis_params, geom, size):
+    url = image.getThumbURL({
+        **vis_params,
+        'region': geom,
+        'dimensions': size,
+        'format': 'png'
+    })
+    resp = requests.get(url, timeout=120)
+    resp.raise_for_status()
+    return resp.content
+
+
+def _encode(png_bytes, fmt):
+    if fmt == 'png':
+        return png_bytes
+    from PIL import Image
+    out = io.BytesIO()
+    Image.open(io.BytesIO(png_bytes)).save(out, format='WEBP', quality=85)
+    return out.getvalue()
+
+
+def render_claim(spec, size=512, fmt='png', kinds=KINDS):
+    """
+    Render the requested thumbnails for one claim spec
+    ({aoi, pre: {start, end}, post: {start, end}, satellite, max_cloud, reducer, max_scenes}).
+    Cached thumbnails are returned without touching Earth Engine; windows that
+    end within the data latency period are re-rendered after RECENT_THUMBNAIL_TTL.
+    """
+    keys = {kind: thumbnail_key(spec, kind, size, fmt) for kind in kinds}
+    max_age = cache_max_age(spec)
+    recent = max_age is not None
+    result = {}
+    missing = []
+    for kind, key in keys.items():
+        if is_cached(key, fmt, max_age):
+            result[kind] = {'key': key, 'file': file_name(key, fmt, recent), 'cached': True}
+        else:
+            missing.append(kind)
+    if not missing:
+        return result
+
+    satellite = spec.get('satellite', 'sentinel2')
+    max_cloud = spec.get('max_cloud', 30)
+    reducer = spec.get('reducer', 'median')
+    max_scenes = spec.get('max_scenes')
+    geom = aoi_to_geometry(spec['aoi'])
+
+    pre_image, _, vis_params = build_composite(
+        spec['aoi'], spec['pre']['start'], spec['pre']['end'], satellite, max_cloud, reducer,
+        max_scenes)
+    post_image, _, _ = build_composite(
+        spec['aoi'], spec['post']['start'], spec['post']['end'], satellite, max_cloud, reducer,
+        max_scenes)
+
+    for kind in missing:
+        if kind == 'pre':
+            png = _fetch_png(pre_image, vis_params, geom, size)
+        elif kind == 'post':
+            png = _fetch_png(post_image, vis_params, geom, size)
+        else:
+            bands = vis_params['bands']
+            diff = (post_image.select(bands).subtract(pre_image.select(bands))
+                    .abs().reduce(ee.Reducer.mean()))
+            png = _fetch_png(diff, DIFF_VIS, geom, size)
+
+        key = keys[kind]
+        _write_cache(key, fmt, _encode(png, fmt), recent)
+        result[kind] = {'key': key, 'file': file_name(key, fmt, recent), 'cached': False}
+
+    return result
+
+
+def render_batch(specs, size=512, fmt='png', kinds=KINDS, concurrency=None):
+    """Render thumbnails for many claims in parallel; per-claim errors are reported, not raised"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported thumbnail format: {fmt}")
+    unknown = [k for k in kinds if k not in KINDS]
+    if unknown:
+        raise ValueError(f"Unsupported thumbnail kinds: {unknown}")
+
+    def render_one(spec):
+        try:
+            return {
+                'id': spec.get('id'),
+                'success': True,
+                'thumbnails': render_claim(spec, size, fmt, kinds)
+            }
+        except Exception as e:
+            print(f"Thumbnail rendering failed for {spec.get('id')}: {e}")
+            return {'id': spec.get('id'), 'success': False, 'error': str(e)}
+
+    concurrency = concurrency or THUMBNAIL_CONCURRENCY
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(specs)))) as pool:
+        return list(pool.map(profiling.propagate(render_one), specs))
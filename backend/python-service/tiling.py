@@ -0,0 +1,168 @@
+"""
+Tiled map-reduce for large AOIs
+Splits an AOI into sub-tiles that each fit the per-call pixel budget,
+reduces the tiles in parallel and merges the partial weighted sums back into
+AOI-level means (no bestEffort coarsening)
+"""
+
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import ee
+
+import ee_memo
+import profiling
+
+MAX_PIXELS = float(os.getenv('TILE_MAX_PIXELS', 1e7))
+TILE_CONCURRENCY = int(os.getenv('TILE_CONCURRENCY', 8))
+
+# Keep each tile comfortably below the budget so edge effects never tip it over
+TILE_FILL_FACTOR = 0.5
+METERS_PER_DEGREE = 111320.0
+
+
+def aoi_bounds(aoi):
+    """Return [minLon, minLat, maxLon, maxLat] for a bbox list or GeoJSON geometry"""
+    if isinstance(aoi, list) and len(aoi) == 4:
+        return [float(v) for v in aoi]
+    if isinstance(aoi, dict) and 'type' in aoi:
+        points = []
+
+        def collect(coords):
+            if coords and isinstance(coords[0], (int, float)):
+                points.append(coords)
+            else:
+                for c in coords:
+                    collect(c)
+
+        if aoi['type'] == 'GeometryCollection':
+            for g in aoi.get('geometries', []):
+                collect(g['coordinates'])
+        else:
+            collect(aoi['coordinates'])
+        if not points:
+            raise ValueError("AOI geometry has no coordinates")
+        lons = [p[0] for p in points]
+        lats = [p[1] for p in points]
+        return [min(lons), min(lats), max(lons), max(lats)]
+    raise ValueError(f"Unsupported AOI type: {type(aoi)}")
+
+
+def estimate_pixels(bounds, scale):
+    """Approximate pixel count of a bbox at the given scale (meters)"""
+    min_lon, min_lat, max_lon, max_lat = bounds
+    mid_lat = math.radians((min_lat + max_lat) / 2.0)
+    width_m = (max_lon - min_lon) * METERS_PER_DEGREE * max(math.cos(mid_lat), 1e-6)
+    height_m = (max_lat - min_lat) * METERS_PER_DEGREE
+    return (width_m / scale) * (height_m / scale)
+
+
+def split_bounds(bounds, scale, max_pixels=None):
+    """Split a bbox into a grid of sub-bboxes that each fit the pixel budget"""
+    max_pixels = max_pixels or MAX_PIXELS
+    budget = max_pixels * TILE_FILL_FACTOR
+    min_lon, min_lat, max_lon, max_lat = bounds
+
+    total = estimate_pixels(bounds, scale)
+    if total <= budget:
+        return [bounds]
+
+    # Square-ish tiles in pixel space, so the grid follows the AOI aspect ratio
+    mid_lat = math.radians((min_lat + max_lat) / 2.0)
+    width_px = (max_lon - min_lon) * METERS_PER_DEGREE * max(math.cos(mid_lat), 1e-6) / scale
+    height_px = (max_lat - min_lat) * METERS_PER_DEGREE / scale
+    side_px = math.sqrt(budget)
+    nx = max(1, math.ceil(width_px / side_px))
+    ny = max(1, math.ceil(height_px / side_px))
+
+    dx = (max_lon - min_lon) / nx
+    dy = (max_lat - min_lat) / ny
+    tiles = []
+    for j in range(ny):
+        for i in range(nx):
+            tiles.append([
+                min_lon + i * dx,
+                min_lat + j * dy,
+                max_lon if i == nx - 1 else min_lon + (i + 1) * dx,
+                max_lat if j == ny - 1 else min_lat + (j + 1) * dy
+            ])
+    return tiles
+
+
+# Suffix of the per-band weight totals in tile partials
+WEIGHT_SUFFIX = '__weight'
+
+
+def _with_weights(image):
+    # A constant-1 band per input band, masked like it: its weighted sum is the
+    # same denominator reduceRegion(mean) uses, so sum / weight is the AOI mean
+    ones = image.multiply(0).add(1)
+    names = image.bandNames().map(lambda b: ee.String(b).cat(WEIGHT_SUFFIX))
+    return image.addBands(ones.rename(names))
+
+
+def check_deadline(deadline):
+    """Cooperative cancellation point between Earth Engine calls (deadline is time.monotonic())"""
+    if deadline is not None and time.monotonic() > deadline:
+        raise TimeoutError('Latency budget exhausted')
+
+
+def _reduce_tile(image, tile_geom, scale, max_pixels, deadline=None):
+    check_deadline(deadline)
+    return ee_memo.get_info(_with_weights(image).reduceRegion(
+        reducer=ee.Reducer.sum(),
+        geometry=tile_geom,
+        scale=scale,
+        maxPixels=max_pixels
+    )) or {}
+
+
+def tiled_mean(image, aoi, scale, max_pixels=None, concurrency=None, deadline=None):
+    """
+    Area-weighted per-band mean of `image` over `aoi`.
+    Small AOIs take a single call; large AOIs are tiled and reduced in parallel
+    under a concurrency cap. Tiles not yet started when `deadline` passes raise
+    TimeoutError. Returns {band: mean or None}.
+    """
+    max_pixels = max_pixels or MAX_PIXELS
+    concurrency = concurrency or TILE_CONCURRENCY
+
+    geom = ee.Geometry.Rectangle(aoi) if isinstance(aoi, list) else ee.Geometry(aoi)
+    tiles = split_bounds(aoi_bounds(aoi), scale, max_pixels)
+
+    if len(tiles) == 1:
+        partials = [_reduce_tile(image, geom, scale, max_pixels, deadline)]
+    else:
+        print(f"🧩 Tiling AOI into {len(tiles)} sub-tiles at {scale}m (concurrency={concurrency})")
+        tile_geoms = [ee.Geometry.Rectangle(t) if isinstance(aoi, list)
+                      else ee.Geometry.Rectangle(t).intersection(geom, 1)
+                      for t in tiles]
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(tiles))) as pool:
+            partials = list(pool.map(
+                profiling.propagate(
+                    lambda g: _reduce_tile(image, g, scale, max_pixels, deadline)),
+                tile_geoms))
+
+    return merge_partials(partials)
+
+
+def merge_partials(partials):
+    """Merge per-tile {band: weighted sum, band__weight: weight} dicts into {band: mean}"""
+    sums = {}
+    weights = {}
+    for part in partials:
+        for key, value in part.items():
+            if value is None:
+                continue
+            if key.endswith(WEIGHT_SUFFIX):
+                band = key[:-len(WEIGHT_SUFFIX)]
+                weights[band] = weights.get(band, 0.0) + value
+            else:
+                sums[key] = sums.get(key, 0.0) + value
+
+    return {
+        band: (sums.get(band, 0.0) / weights[band]) if weights.get(band) else None
+        for band in set(sums) | set(weights)
+    }
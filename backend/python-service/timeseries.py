@@ -0,0 +1,107 @@
+"""
+Server-side index time series
+Maps a per-image regional reduction over the collection inside Earth Engine
+and pulls every requested index for every AOI back in a single getInfo().
+"""
+
+import ee
+
+import ee_memo
+from imagery import aoi_to_geometry, daily_imerg, mask_s2
+
+S2_DATASET = 'COPERNICUS/S2_SR_HARMONIZED'
+S1_DATASET = 'COPERNICUS/S1_GRD'
+
+
+def _s2_index(bands):
+    def build(geom, start_date, end_date, max_cloud):
+        return (ee.ImageCollection(S2_DATASET)
+                .filterBounds(geom)
+                .filterDate(start_date, end_date)
+                .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', max_cloud))
+                .map(lambda img: mask_s2(img)
+                     .normalizedDifference(bands)
+                     .rename('value')
+                     .copyProperties(img, ['system:time_start'])))
+    return build
+
+
+def _s1_vv(geom, start_date, end_date, max_cloud):
+    return (ee.ImageCollection(S1_DATASET)
+            .filterBounds(geom)
+            .filterDate(start_date, end_date)
+            .filter(ee.Filter.eq('instrumentMode', 'IW'))
+            .filter(ee.Filter.eq('orbitProperties_pass', 'DESCENDING'))
+            .select(['VV'], ['value']))
+
+
+def _precipitation(geom, start_date, end_date, max_cloud):
+    # IMERG is half-hourly; daily totals are aggregated server-side
+    return daily_imerg(start_date, end_date).select(['precipitation'], ['value'])
+
+
+# Collection builder and default reduction scale (meters) per index
+INDICES = {
+    'ndvi': {'build': _s2_index(['B8', 'B4']), 'scale': 20},
+    'ndwi': {'build': _s2_index(['B3', 'B8']), 'scale': 20},
+    's1_vv': {'build': _s1_vv, 'scale': 20},
+    'precipitation': {'build': _precipitation, 'scale': 10000}
+}
+
+
+def build_timeseries(aois, indices, start_date, end_date, scale=None, max_cloud=30):
+    """
+    Fetch the mean of each index per AOI per observation in one round trip.
+    `aois` is a list of {id, aoi}. Returns
+    {index: {'aoi': [...], 'time': [...], 'value': [...], 'last_available': date}}
+    (columnar), where `last_available` is the latest observation in the range.
+    """
+    unknown = [i for i in indices if i not in INDICES]
+    if unknown:
+        raise ValueError(f"Unsupported indices: {unknown}")
+
+    features = ee.FeatureCollection([
+        ee.Feature(aoi_to_geometry(a['aoi']), {'aoi_id': str(a.get('id', n))})
+        for n, a in enumerate(aois)
+    ])
+    bounds = features.geometry()
+
+    columns = {}
+    for index in indices:
+        spec = INDICES[index]
+        index_scale = scale or spec['scale']
+        coll = spec['build'](bounds, start_date, end_date, max_cloud).sort('system:time_start')
+
+        def reduce_image(img, index_scale=index_scale):
+            t = img.date().format('YYYY-MM-dd')
+            return (img.reduceRegions(
+                        collection=features,
+                        reducer=ee.Reducer.mean(),
+                        scale=index_scale)
+                    .filter(ee.Filter.notNull(['mean']))
+                    .map(lambda f: f.set('t', t)))
+
+        table = ee.FeatureCollection(coll.map(reduce_image)).flatten()
+        last_available = ee.Algorithms.If(
+            coll.size().gt(0),
+            ee.Date(coll.aggregate_max('system:time_start')).format('YYYY-MM-dd'),
+            None)
+        columns[index] = ee.Dictionary({
+            'rows': table.reduceColumns(
+                ee.Reducer.toList(3), ['aoi_id', 't', 'mean']).get('list'),
+            'last_available': last_available
+        })
+
+    by_index = ee_memo.get_info(ee.Dictionary(columns))
+
+    result = {}
+    for index in indices:
+        entry = by_index.get(index) or {}
+        rows = entry.get('rows') or []
+        result[index] = {
+            'aoi': [r[0] for r in rows],
+            'time': [r[1] for r in rows],
+            'value': [r[2] for r in rows],
+            'last_available': entry.get('last_available')
+        }
+    return result